@@ -0,0 +1,73 @@
+"""
+Cost of crash-safe saves in ImageSaver for each fsync mode.
+
+Saves wallpaper-sized files one at a time, as a rotation does, and with
+several saves in flight, as the crawler does. Every mode writes a temp file
+and renames it; "always" also fsyncs the file and the directory on every
+save, "batch" fsyncs the file and the directory once per batch.
+
+Usage:
+    python benchmarks/bench_durability.py [directory]
+
+The directory should be on the disk the wallpapers are saved to; the
+default is a temp directory, which may live on tmpfs where fsync is free.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from anime_wallpaper_changer.core.saver import FSYNC_MODES, ImageSaver  # noqa: E402
+
+FILES = 200
+FILE_SIZE = 400 * 1024
+CONCURRENCY = 8
+BATCH_SIZE = 32
+
+
+async def save_all(saver: ImageSaver, data: bytes, concurrency: int) -> float:
+    """Seconds to save FILES files with the given number of saves in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def save(index: int) -> None:
+        async with semaphore:
+            assert await saver.save_image(data, f"wallpaper_{index}.jpg")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(save(index) for index in range(FILES)))
+    await saver.flush()
+    return time.perf_counter() - started
+
+
+def measure(root: Path, mode: str, concurrency: int) -> Tuple[float, float]:
+    """Milliseconds per file and files per second"""
+    output_dir = Path(tempfile.mkdtemp(dir=root))
+    try:
+        saver = ImageSaver(output_dir, fsync=mode, fsync_batch=BATCH_SIZE)
+        elapsed = asyncio.run(save_all(saver, os.urandom(FILE_SIZE), concurrency))
+    finally:
+        shutil.rmtree(output_dir)
+    return elapsed / FILES * 1000, FILES / elapsed
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(tempfile.gettempdir())
+    print(f"{FILES} files of {FILE_SIZE // 1024} KiB in {root}")
+    print(f"{'mode':<10}{'in flight':>10}{'ms/file':>10}{'files/s':>10}")
+    for concurrency in (1, CONCURRENCY):
+        for mode in FSYNC_MODES:
+            per_file, rate = measure(root, mode, concurrency)
+            print(f"{mode:<10}{concurrency:>10}{per_file:>10.2f}{rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Effect rendering cost of the Pillow and NumPy backends.
+
+Renders effect stacks on a synthetic wallpaper at every resolution the
+catalog offers, with each backend. Point effects are fused by both: the
+Pillow backend runs them as Image.point or a matrix conversion, the NumPy
+backend as lookup tables and channel mixing in place on one array. Times
+include the conversion from and to a PIL image. The "enhance" column is the
+unfused chain of ImageEnhance calls, one per effect, for reference.
+
+Usage:
+    python benchmarks/bench_effects.py
+"""
+
+import logging
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from anime_wallpaper_changer.core.effects import (  # noqa: E402
+    EFFECT_BACKENDS,
+    EffectStack,
+    ImageEffect,
+)
+from anime_wallpaper_changer.utils.constants import RESOLUTIONS  # noqa: E402
+
+REPEATS = 5
+STACKS: Dict[str, EffectStack] = {
+    "brightness": EffectStack((("Яркость", 1.3),)),
+    "contrast": EffectStack((("Контраст", 1.2),)),
+    "saturation": EffectStack((("Насыщенность", 1.4),)),
+    "all three": EffectStack(
+        (("Яркость", 0.8), ("Контраст", 1.2), ("Насыщенность", 0.6))
+    ),
+}
+
+
+def make_wallpaper(size: Tuple[int, int]) -> Image.Image:
+    """Detailed RGB wallpaper of the given size"""
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.dstack([x % 256, y % 256, (x * y) % 256]).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def enhance_chain(img: Image.Image, stack: EffectStack) -> Image.Image:
+    """Effects applied one by one through ImageEffect.EFFECTS"""
+    for name, intensity in stack.layers:
+        img = ImageEffect.EFFECTS[name](img, intensity)
+    return img
+
+
+def best_ms(render: Callable[[], Image.Image]) -> float:
+    """Best time of one render in milliseconds"""
+    return min(timeit.Timer(render).repeat(repeat=REPEATS, number=1)) * 1000
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    header = "".join(f"{column:>10}" for column in ("enhance", *EFFECT_BACKENDS))
+    print(f"{'resolution':<12}{'stack':<12}{header}   (ms/frame)")
+    for resolution in RESOLUTIONS.values():
+        width, height = (int(side) for side in resolution.split("x"))
+        img = make_wallpaper((width, height))
+        for name, stack in STACKS.items():
+            row = f"{best_ms(lambda: enhance_chain(img, stack)):>10.1f}"
+            for backend in EFFECT_BACKENDS:
+                row += f"{best_ms(lambda: stack.render(img, backend)):>10.1f}"
+            print(f"{resolution:<12}{name:<12}{row}")
+
+
+if __name__ == "__main__":
+    main()
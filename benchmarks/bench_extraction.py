@@ -0,0 +1,129 @@
+"""
+Microbenchmark of HTML extraction on saved catalog and wallpaper pages.
+
+Compares the previous full BeautifulSoup tree parsing with the targeted
+lxml extraction used by WallpapersCraftParser, both on a whole page and
+in streaming mode, where 8 KiB chunks are fed until the collector is done.
+
+Usage:
+    python benchmarks/bench_extraction.py
+"""
+
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from lxml import etree  # noqa: E402
+
+from anime_wallpaper_changer.core.config import Config  # noqa: E402
+from anime_wallpaper_changer.core.parser import (  # noqa: E402
+    ElementCollector,
+    extract_image_url,
+    extract_wallpaper_links,
+    image_url_collector,
+    wallpaper_links_collector,
+)
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+REPEATS = 200
+CHUNK_SIZE = 8 * 1024
+
+
+def soup_wallpaper_links(content: str) -> Tuple[str, ...]:
+    """Previous implementation: full tree, then find_all by class"""
+    soup = BeautifulSoup(content, "lxml")
+    return tuple(link.get("href") for link in soup.find_all(class_="wallpapers__link"))
+
+
+def soup_image_url(content: str) -> Optional[str]:
+    """Previous implementation: full tree, then find by class"""
+    soup = BeautifulSoup(content, "lxml")
+    element = soup.find(class_="wallpaper__image")
+    return element.get("src") if element else None
+
+
+def stream_values(
+    content: str, collector: ElementCollector
+) -> Tuple[Tuple[str, ...], int]:
+    """Feed page in chunks until the collector is done, as the parser does"""
+    data = content.encode("utf-8")
+    parser = etree.HTMLParser(target=collector, encoding="utf-8")
+    consumed = 0
+    while consumed < len(data) and not collector.done:
+        parser.feed(data[consumed : consumed + CHUNK_SIZE])
+        consumed += CHUNK_SIZE
+    return collector.close(), min(consumed, len(data))
+
+
+def stream_wallpaper_links(content: str) -> Tuple[str, ...]:
+    return stream_values(content, wallpaper_links_collector())[0]
+
+
+def stream_image_url(content: str) -> Optional[str]:
+    values = stream_values(content, image_url_collector())[0]
+    return values[0] if values else None
+
+
+def measure(func: Callable[[str], object], content: str) -> Tuple[float, int]:
+    """Best time per call in milliseconds and peak traced memory in bytes"""
+    timer = timeit.Timer(lambda: func(content))
+    best = min(timer.repeat(repeat=5, number=REPEATS)) / REPEATS * 1000
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    cases = [
+        (
+            "catalog_page.html",
+            ("BeautifulSoup", soup_wallpaper_links),
+            ("lxml target", extract_wallpaper_links),
+            ("lxml stream", stream_wallpaper_links),
+        ),
+        (
+            "wallpaper_page.html",
+            ("BeautifulSoup", soup_image_url),
+            ("lxml target", extract_image_url),
+            ("lxml stream", stream_image_url),
+        ),
+    ]
+
+    print(f"{'page':<22}{'engine':<16}{'time, ms':>10}{'peak, KiB':>12}")
+    for filename, *engines in cases:
+        content = (FIXTURES_DIR / filename).read_text(encoding="utf-8")
+        results = [func(content) for _, func in engines]
+        assert len(set(results)) == 1, f"Engines disagree on {filename}"
+
+        for name, func in engines:
+            best, peak = measure(func, content)
+            print(f"{filename:<22}{name:<16}{best:>10.3f}{peak / 1024:>12.1f}")
+
+    print()
+    for filename, collector_factory in (
+        ("catalog_page.html", wallpaper_links_collector),
+        ("wallpaper_page.html", image_url_collector),
+    ):
+        content = (FIXTURES_DIR / filename).read_text(encoding="utf-8")
+        _, consumed = stream_values(content, collector_factory())
+        total = len(content.encode("utf-8"))
+        tail = total - consumed
+        # A short tail is drained for keep-alive, a long one is never downloaded
+        if tail <= Config.STREAM_DRAIN_LIMIT:
+            outcome = f"tail of {tail} bytes drained, connection reused"
+        else:
+            outcome = f"tail of {tail} bytes skipped, connection closed"
+        print(f"{filename}: streaming parses {consumed} of {total} bytes, {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-frame cost of handing an effect preview from PIL to Qt.
+
+Renders a synthetic 3840x2160 wallpaper down to the preview proxy once,
+then times one slider frame three ways: the previous JPEG encode in PIL
+followed by QImage.fromData, the Pillow result copied once into a raw
+buffer, and the NumPy result array wrapped as it is. The last two wrap
+the buffer as a QImage without copying. All end with QPixmap.fromImage,
+as the window does.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_preview.py
+"""
+
+import io
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+from PIL import Image
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QApplication
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from anime_wallpaper_changer.core.effects import (  # noqa: E402
+    ImageEffect,
+    PreviewFrame,
+)
+from anime_wallpaper_changer.ui.preview import frame_to_qimage  # noqa: E402
+
+SOURCE_SIZE = (3840, 2160)
+REPEATS = 200
+EFFECT = "Яркость"
+INTENSITY = 1.3
+
+
+def make_proxy() -> Image.Image:
+    """Preview proxy of a detailed 4K wallpaper"""
+    width, height = SOURCE_SIZE
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.dstack([x % 256, y % 256, (x * y) % 256]).astype(np.uint8)
+    img = Image.fromarray(pixels, "RGB")
+    img.thumbnail(ImageEffect.PREVIEW_SIZE, Image.Resampling.LANCZOS)
+    return img
+
+
+def jpeg_handoff(img: Image.Image) -> QPixmap:
+    """Previous path: encode to JPEG, decode in Qt"""
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG")
+    return QPixmap.fromImage(QImage.fromData(buffer.getvalue()))
+
+
+def raw_handoff(img: Image.Image) -> QPixmap:
+    """Pillow pixels copied once into the frame, wrapped by QImage"""
+    frame = PreviewFrame.from_image(img)
+    return QPixmap.fromImage(frame_to_qimage(frame))
+
+
+def array_handoff(pixels: np.ndarray) -> QPixmap:
+    """NumPy result array wrapped by QImage without any copy"""
+    frame = PreviewFrame.from_array(pixels)
+    return QPixmap.fromImage(frame_to_qimage(frame))
+
+
+def main() -> None:
+    app = QApplication(sys.argv)  # noqa: F841
+    proxy = make_proxy()
+    processed = ImageEffect.EFFECTS[EFFECT](proxy, INTENSITY)
+    effect_time = timeit.timeit(
+        lambda: ImageEffect.EFFECTS[EFFECT](proxy, INTENSITY), number=REPEATS
+    )
+
+    pixels = np.array(processed)
+
+    handoffs: Dict[str, Callable[[], QPixmap]] = {
+        "JPEG round-trip": lambda: jpeg_handoff(processed),
+        "Pillow buffer": lambda: raw_handoff(processed),
+        "NumPy array": lambda: array_handoff(pixels),
+    }
+    print(f"proxy {proxy.width}x{proxy.height}, effect {EFFECT}")
+    print(f"effect itself: {effect_time / REPEATS * 1000:.3f} ms/frame")
+    print(f"{'handoff':<18}{'ms/frame':>10}")
+    for name, handoff in handoffs.items():
+        assert not handoff().isNull()
+        timer = timeit.Timer(handoff)
+        best = min(timer.repeat(repeat=5, number=REPEATS)) / REPEATS * 1000
+        print(f"{name:<18}{best:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ setup(
         "lxml>=5.3.0",
         "PyQt6>=6.6.0",
         "qasync>=0.27.0",
+        "pillow>=11.1.0",
+        "numpy>=2.0.0",
     ],
     python_requires=">=3.12",
     entry_points={
@@ -5,6 +5,7 @@ Anime Wallpaper Changer - приложение для автоматическо
 __version__ = "0.1.0"
 
 from .core.config import Config
+from .core.http import HttpClient
 from .core.parser import WallpapersCraftParser, ParsingError
 from .core.saver import ImageSaver
 from .core.wallpaper import WallpaperSetter
@@ -12,6 +13,7 @@ from .ui.main_window import MainWindow
 
 __all__ = [
     "Config",
+    "HttpClient",
     "WallpapersCraftParser",
     "ParsingError",
     "ImageSaver",
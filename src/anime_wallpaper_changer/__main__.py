@@ -3,7 +3,6 @@ import asyncio
 import sys
 from pathlib import Path
 
-import aiohttp
 from PyQt6.QtWidgets import QApplication
 from qasync import QEventLoop
 
@@ -13,8 +12,12 @@ if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
 from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.crawler import Crawler
+from anime_wallpaper_changer.core.http import HttpClient
 from anime_wallpaper_changer.core.parser import ParsingError, WallpapersCraftParser
+from anime_wallpaper_changer.core.prefetch import PrefetchQueue
 from anime_wallpaper_changer.core.saver import ImageSaver
+from anime_wallpaper_changer.core.sync import CatalogSync, SyncStateStore
 from anime_wallpaper_changer.core.wallpaper import WallpaperSetter
 from anime_wallpaper_changer.ui.main_window import MainWindow
 from anime_wallpaper_changer.utils.logger import setup_logger
@@ -25,51 +28,130 @@ logger = setup_logger(__name__)
 async def run_cli(args: argparse.Namespace) -> None:
     """Запуск в режиме командной строки"""
     config = Config()
-    parser = WallpapersCraftParser(config)
-    saver = ImageSaver(config.OUTPUT_DIR)
+    saver = ImageSaver.from_config(config)
     wallpaper_setter = WallpaperSetter()
 
     try:
-        # Обновляем путь каталога с учетом аргументов
-        parser.catalog_path = config.get_catalog_path(args.category, args.resolution)
+        await saver.rescan()
+        async with HttpClient(config) as http_client:
+            parser = WallpapersCraftParser(config, http_client)
+            prefetch_queue = PrefetchQueue(parser, saver, config)
 
-        async with aiohttp.ClientSession() as session:
-            # Получаем URL случайного изображения
-            image_url = await parser.get_random_image_url()
-            logger.info(f"Получен URL изображения: {image_url}")
+            # Обновляем путь каталога с учетом аргументов
+            prefetch_queue.set_catalog(
+                config.get_catalog_path(args.category, args.resolution)
+            )
 
-            # Загружаем изображение
-            image_data = await parser.download_image(image_url, session)
-
-            # Генерируем имя файла из URL
-            filename = image_url.split("/")[-1]
-
-            # Сохраняем изображение
-            image_path = await saver.save_image(image_data, filename)
+            # Берем подготовленные обои или загружаем новые
+            image_path = await prefetch_queue.get()
 
             # Устанавливаем обои
             if wallpaper_setter.set_wallpaper(image_path):
+                saver.record_shown(image_path)
                 logger.info("Обои успешно установлены")
             else:
                 logger.error("Не удалось установить обои")
 
+            # Готовим обои для следующего запуска
+            await prefetch_queue.wait_filled()
+            await saver.flush()
+            parser.cancel_background_tasks()
+            parser.update_stats()
+            logger.info(f"Статистика парсера: {parser.stats}")
+
     except ParsingError as e:
         logger.error(f"Ошибка парсинга: {e}")
     except Exception as e:
         logger.error(f"Неожиданная ошибка: {e}")
 
 
+async def run_offline(args: argparse.Namespace) -> None:
+    """Смена обоев из ранее загруженных без обращения к сайту"""
+    config = Config()
+    saver = ImageSaver.from_config(config)
+    wallpaper_setter = WallpaperSetter()
+
+    await saver.rescan()
+    image_path = saver.pick_local(args.category, args.resolution)
+    if image_path is None:
+        logger.error(f"В папке {config.OUTPUT_DIR} нет сохраненных обоев")
+    elif wallpaper_setter.set_wallpaper(image_path):
+        saver.record_shown(image_path)
+        logger.info(f"Обои успешно установлены: {image_path}")
+    else:
+        logger.error("Не удалось установить обои")
+
+
+async def run_crawl(args: argparse.Namespace) -> None:
+    """Массовая загрузка обоев каталога"""
+    config = Config()
+    saver = ImageSaver.from_config(config)
+
+    try:
+        await saver.rescan()
+        async with HttpClient(config) as http_client:
+            parser = WallpapersCraftParser(config, http_client)
+            parser.catalog_path = config.get_catalog_path(
+                args.category, args.resolution
+            )
+
+            crawler = Crawler(parser, saver, config)
+            if args.sync:
+                state_store = SyncStateStore(config.CACHE_DIR / "sync.json")
+                await CatalogSync(crawler, state_store).run()
+            else:
+                await crawler.run(pages=args.pages, count=args.count)
+            await saver.flush()
+            parser.cancel_background_tasks()
+            parser.update_stats()
+            logger.info(f"Статистика парсера: {parser.stats}")
+
+    except ParsingError as e:
+        logger.error(f"Ошибка парсинга: {e}")
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка: {e}")
+
+
+def parse_page_range(value: str) -> range:
+    """Разбор диапазона страниц вида 3 или 1-10"""
+    try:
+        first, _, last = value.partition("-")
+        start = int(first)
+        stop = int(last) if last else start
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректный диапазон страниц: {value}")
+    if start < 1 or stop < start:
+        raise argparse.ArgumentTypeError(f"Некорректный диапазон страниц: {value}")
+    return range(start, stop + 1)
+
+
+def parse_count(value: str) -> int:
+    """Разбор количества обоев, не меньше одного"""
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Некорректное количество обоев: {value}")
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"Некорректное количество обоев: {value}")
+    return count
+
+
 def run_gui() -> None:
     """Запуск в режиме GUI"""
     app = QApplication(sys.argv)
     loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
 
+    # Сигнал о завершении приложения, чтобы корректно закрыть сетевые ресурсы
+    app_close_event = asyncio.Event()
+    app.aboutToQuit.connect(app_close_event.set)
+
     window = MainWindow()
     window.show()
 
     with loop:
-        loop.run_forever()
+        loop.run_until_complete(app_close_event.wait())
+        loop.run_until_complete(window.shutdown())
 
 
 def main() -> None:
@@ -80,10 +162,39 @@ def main() -> None:
     )
     parser.add_argument("--category", help="Категория обоев", default="anime")
     parser.add_argument("--resolution", help="Разрешение обоев", default="1920x1080")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Выбрать обои из ранее загруженных, не обращаясь к сайту",
+    )
+    parser.add_argument(
+        "--crawl", action="store_true", help="Загрузить много обоев каталога"
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Докачать новые обои каталога с прошлой синхронизации",
+    )
+    parser.add_argument(
+        "--count",
+        type=parse_count,
+        help="Количество обоев для загрузки (включает --crawl)",
+    )
+    parser.add_argument(
+        "--pages",
+        type=parse_page_range,
+        help="Диапазон страниц каталога, например 1-10 (включает --crawl)",
+    )
 
     args = parser.parse_args()
 
-    if args.cli:
+    if args.crawl or args.sync or args.count is not None or args.pages is not None:
+        # Массовая загрузка без установки обоев
+        asyncio.run(run_crawl(args))
+    elif args.offline:
+        # Смена обоев из локальной библиотеки
+        asyncio.run(run_offline(args))
+    elif args.cli:
         # Запуск в режиме командной строки
         asyncio.run(run_cli(args))
     else:
@@ -0,0 +1,220 @@
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import asyncio
+import json
+import time
+
+import aiofiles
+
+from anime_wallpaper_changer.utils.logger import setup_logger
+from anime_wallpaper_changer.utils.storage import atomic_write, read_json, write_json
+
+logger = setup_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogPage:
+    """Parsed catalog page: wallpaper links plus HTTP validators"""
+
+    hrefs: Tuple[str, ...]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = field(default_factory=time.time)
+
+    def is_fresh(self, ttl: float) -> bool:
+        """Whether the page can be used without revalidation"""
+        return time.time() - self.fetched_at < ttl
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidation"""
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def revalidated(self) -> "CatalogPage":
+        """Copy of the page confirmed as unchanged by the server"""
+        return replace(self, fetched_at=time.time())
+
+
+class CatalogCache:
+    """
+    On-disk cache of parsed catalog pages.
+
+    Each (category, resolution, page) is stored as a small JSON file with the
+    extracted wallpaper links, so repeated picks from the same page need
+    neither a network request nor HTML parsing.
+    """
+
+    def __init__(self, cache_dir: Path, ttl: float) -> None:
+        self.cache_dir: Path = cache_dir
+        self.ttl: float = ttl
+        self._pages: Dict[Tuple[str, int], CatalogPage] = {}
+
+    def _page_file(self, catalog_path: str, page: int) -> Path:
+        """Path of the cache file for the catalog page"""
+        return self.cache_dir.joinpath(*catalog_path.strip("/").split("/")) / (
+            f"page{page}.json"
+        )
+
+    def get(self, catalog_path: str, page: int) -> Optional[CatalogPage]:
+        """Get cached page regardless of its freshness"""
+        key = (catalog_path, page)
+        if key in self._pages:
+            return self._pages[key]
+
+        data = read_json(self._page_file(catalog_path, page))
+        if not isinstance(data, dict) or not data.get("hrefs"):
+            return None
+
+        entry = CatalogPage(
+            hrefs=tuple(data["hrefs"]),
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+            fetched_at=float(data.get("fetched_at", 0.0)),
+        )
+        self._pages[key] = entry
+        return entry
+
+    async def put(self, catalog_path: str, page: int, entry: CatalogPage) -> None:
+        """Store page in memory and on disk"""
+        self._pages[(catalog_path, page)] = entry
+        await write_json(
+            self._page_file(catalog_path, page),
+            {
+                "hrefs": list(entry.hrefs),
+                "etag": entry.etag,
+                "last_modified": entry.last_modified,
+                "fetched_at": entry.fetched_at,
+            },
+        )
+
+
+class ImageUrlIndex:
+    """
+    Persistent index of direct image URLs.
+
+    Maps a wallpaper page link plus resolution to the image URL found on that
+    page, so a known wallpaper can be downloaded without fetching its page.
+    Entries are appended to a JSON Lines file and loaded lazily on first use.
+    Compaction replaces the file atomically, flushed as ``fsync`` says.
+    """
+
+    def __init__(self, index_file: Path, fsync: str = "always") -> None:
+        self.index_file: Path = index_file
+        self.fsync: str = fsync
+        self._urls: Optional[Dict[Tuple[str, str], str]] = None
+        self._lines: int = 0
+
+    def _load(self) -> Dict[Tuple[str, str], str]:
+        """Load index from disk once"""
+        if self._urls is not None:
+            return self._urls
+
+        self._urls = {}
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        href, resolution, url = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._urls[(href, resolution)] = url
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать индекс изображений: {e}")
+        return self._urls
+
+    def get(self, href: str, resolution: str) -> Optional[str]:
+        """Get known image URL for the wallpaper page"""
+        return self._load().get((href, resolution))
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._load()
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    async def put(self, href: str, resolution: str, url: str) -> None:
+        """Remember image URL of the wallpaper page"""
+        urls = self._load()
+        if urls.get((href, resolution)) == url:
+            return
+        urls[(href, resolution)] = url
+
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(
+                self.index_file, mode="a", encoding="utf-8"
+            ) as file:
+                await file.write(json.dumps([href, resolution, url]) + "\n")
+            self._lines += 1
+        except OSError as e:
+            logger.warning(f"Не удалось обновить индекс изображений: {e}")
+            return
+
+        # Старые записи для тех же ключей накапливаются в журнале
+        if self._lines > 2 * len(urls) + 100:
+            await self.compact()
+
+    async def compact(self) -> None:
+        """Rewrite index file without superseded entries"""
+        urls = self._load()
+        text = "".join(
+            json.dumps([href, resolution, url]) + "\n"
+            for (href, resolution), url in urls.items()
+        )
+
+        def write() -> None:
+            with atomic_write(self.index_file, "w", self.fsync) as file:
+                file.write(text)
+
+        try:
+            await asyncio.to_thread(write)
+            self._lines = len(urls)
+        except OSError as e:
+            logger.warning(f"Не удалось сжать индекс изображений: {e}")
+
+
+class PageCountCache:
+    """
+    Persistent number of catalog pages per (category, resolution).
+
+    Stored in a single JSON file; entries older than the refresh interval
+    are rediscovered by the parser.
+    """
+
+    def __init__(self, cache_file: Path, refresh_interval: float) -> None:
+        self.cache_file: Path = cache_file
+        self.refresh_interval: float = refresh_interval
+        self._counts: Optional[Dict[str, Dict[str, float]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        """Load page counts from disk once"""
+        if self._counts is None:
+            data = read_json(self.cache_file)
+            self._counts = data if isinstance(data, dict) else {}
+        return self._counts
+
+    def get(self, catalog_path: str) -> Optional[int]:
+        """Get known page count regardless of its age"""
+        entry = self._load().get(catalog_path)
+        return int(entry["pages"]) if entry else None
+
+    def is_fresh(self, catalog_path: str) -> bool:
+        """Whether the page count does not need to be rediscovered"""
+        entry = self._load().get(catalog_path)
+        if not entry:
+            return False
+        return time.time() - entry["checked_at"] < self.refresh_interval
+
+    async def put(self, catalog_path: str, pages: int) -> None:
+        """Store discovered page count"""
+        counts = self._load()
+        counts[catalog_path] = {"pages": pages, "checked_at": time.time()}
+        await write_json(self.cache_file, counts)
@@ -30,6 +30,27 @@ def get_platform_specific_path(folder_name: str) -> Path:
     return Path(folder_name)
 
 
+def get_platform_specific_cache_path(app_name: str) -> Path:
+    """
+    Get platform-specific path for application cache files.
+
+    Args:
+        app_name: Name of the application cache folder
+
+    Returns:
+        Path object with platform-specific cache directory
+    """
+    system = platform.system().lower()
+
+    if system == "windows":
+        local_app_data = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
+        return Path(local_app_data) / app_name / "cache"
+    elif system == "linux":
+        xdg_cache = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        return Path(xdg_cache) / app_name
+    return Path(f".{app_name}_cache")
+
+
 @dataclass
 class Config:
     """
@@ -42,16 +63,73 @@ class Config:
     WALLPAPER_BASE_URL: Final[str] = "https://wallpaperscraft.ru"
     WALLPAPER_CATALOG_PATH: Final[str] = "/catalog"
     WALLPAPER_FOLDER_NAME: Final[str] = "Wallpapers"
+    CACHE_FOLDER_NAME: Final[str] = "anime_wallpaper_changer"
     MAX_PAGE_LIMIT: Final[int] = 254
     MAX_CONCURRENT_DOWNLOADS: Final[int] = 3
     DEFAULT_RESOLUTION: Final[str] = DEFAULT_RESOLUTION
     DEFAULT_CATEGORY: Final[str] = DEFAULT_CATEGORY
     MAX_PAGES: Final[int] = 254
+    HTTP_CONNECTION_LIMIT: Final[int] = 10
+    HTTP_DNS_CACHE_TTL: Final[int] = 300
+    HTTP_KEEPALIVE_TIMEOUT: Final[float] = 30.0
+    HTTP_CONNECT_TIMEOUT: Final[float] = 10.0
+    HTTP_TOTAL_TIMEOUT: Final[float] = 60.0
+    PARSER_STREAMING: Final[bool] = True
+    STREAM_CHUNK_SIZE: Final[int] = 8 * 1024
+    STREAM_DRAIN_LIMIT: Final[int] = 16 * 1024
+    REQUEST_TIMEOUT: Final[float] = 20.0
+    ROTATION_DEADLINE: Final[float] = 90.0
+    OFFLINE_ROTATION_DEADLINE: Final[float] = 5.0
+    RETRY_ATTEMPTS: Final[int] = 3
+    RETRY_BASE_DELAY: Final[float] = 0.5
+    RETRY_MAX_DELAY: Final[float] = 8.0
+    CIRCUIT_FAILURE_THRESHOLD: Final[int] = 5
+    CIRCUIT_RESET_TIMEOUT: Final[float] = 60.0
+    HEDGE_REQUESTS: Final[bool] = True
+    HEDGE_QUANTILE: Final[float] = 0.95
+    HEDGE_MAX_EXTRA_LOAD: Final[float] = 0.1
+    HEDGE_LATENCY_WINDOW: Final[int] = 200
+    HEDGE_MIN_SAMPLES: Final[int] = 20
+    HEDGE_MIN_DELAY: Final[float] = 0.05
+    RATE_LIMIT: Final[float] = 4.0
+    RATE_LIMIT_MIN: Final[float] = 0.5
+    RATE_LIMIT_MAX: Final[float] = 20.0
+    RATE_LIMIT_BURST: Final[float] = 4.0
+    RATE_LIMIT_STEP: Final[float] = 0.2
+    CONCURRENCY_INITIAL: Final[int] = 4
+    CONCURRENCY_MIN: Final[int] = 1
+    CONCURRENCY_MAX: Final[int] = 10
+    CONCURRENCY_DECREASE_FACTOR: Final[float] = 0.5
+    RETRY_AFTER_MAX: Final[float] = 120.0
+    CONTENT_STORE: Final[bool] = True
+    LIBRARY_INDEX: Final[bool] = True
+    DISK_QUOTA_BYTES: Final[Optional[int]] = None
+    DISK_QUOTA_FILES: Final[Optional[int]] = None
+    EVICTION_POLICY: Final[str] = "lru"
+    FSYNC_MODE: Final[str] = "batch"
+    FSYNC_BATCH_SIZE: Final[int] = 32
+    EFFECT_BACKEND: Final[str] = "pillow"
+    DEDUP_ENABLED: Final[bool] = True
+    DEDUP_MAX_DISTANCE: Final[int] = 6
+    DEDUP_RECENT_WINDOW: Final[int] = 500
+    DEDUP_MAX_REJECTS: Final[int] = 3
+    DOWNLOAD_CHUNK_SIZE: Final[int] = 64 * 1024
+    DOWNLOAD_ATTEMPTS: Final[int] = 3
+    CATALOG_CACHE_TTL: Final[float] = 6 * 60 * 60
+    PAGE_COUNT_REFRESH_INTERVAL: Final[float] = 24 * 60 * 60
+    IMAGE_URL_INDEX_WARMUP: Final[bool] = False
+    PREFETCH_DEPTH: Final[int] = 3
+    PREFETCH_CONCURRENCY: Final[int] = 1
+    PREFETCH_DISK_BUDGET: Final[int] = 100 * 1024 * 1024
+    CRAWL_PAGE_CONCURRENCY: Final[int] = 2
 
     def __init__(self) -> None:
         self._output_dir: Path = get_platform_specific_path(
             folder_name=self.WALLPAPER_FOLDER_NAME
         )
+        self._cache_dir: Path = get_platform_specific_cache_path(
+            app_name=self.CACHE_FOLDER_NAME
+        )
 
     @property
     def OUTPUT_DIR(self) -> Path:
@@ -70,6 +148,21 @@ class Config:
             path.mkdir(parents=True, exist_ok=True)
         self._output_dir = path
 
+    @property
+    def CACHE_DIR(self) -> Path:
+        """Get the directory path for persistent parser caches."""
+        return self._cache_dir
+
+    @CACHE_DIR.setter
+    def CACHE_DIR(self, path: Path) -> None:
+        """
+        Set a new directory path for persistent parser caches.
+
+        Args:
+            path: New Path object for cache directory
+        """
+        self._cache_dir = path
+
     def get_catalog_path(
         self, category: Optional[str] = None, resolution: Optional[str] = None
     ) -> str:
@@ -0,0 +1,278 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AbstractSet, List, Optional
+import asyncio
+import time
+
+from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.dedup import PerceptualIndex, dhash
+from anime_wallpaper_changer.core.errors import CircuitOpenError, ParsingError
+from anime_wallpaper_changer.core.parser import WallpapersCraftParser
+from anime_wallpaper_changer.core.prefetch import validate_image
+from anime_wallpaper_changer.core.saver import ImageSaver
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class CrawlStats:
+    """Counters of a bulk download"""
+
+    images: int = 0
+    bytes: int = 0
+    skipped: int = 0
+    failures: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        """Saved wallpapers per second"""
+        return self.images / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        """Downloaded megabytes per second"""
+        return self.bytes / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"images={self.images}, skipped={self.skipped}, "
+            f"failures={self.failures}, size={self.bytes / 1024 / 1024:.1f} MB, "
+            f"time={self.elapsed:.1f}s, {self.images_per_second:.2f} images/s, "
+            f"{self.megabytes_per_second:.2f} MB/s"
+        )
+
+
+class Crawler:
+    """
+    Bulk download of a catalog into the output folder.
+
+    Catalog pages are read by one group of workers and the wallpaper links
+    they find are passed through a bounded queue to download workers, so
+    page parsing and image downloads overlap and each has its own
+    concurrency limit. Wallpapers already present in the folder are skipped.
+
+    With a set of known wallpaper links the crawl is incremental: known
+    links are not downloaded, and pages are read only until the first page
+    that has no unknown links.
+    """
+
+    def __init__(
+        self,
+        parser: WallpapersCraftParser,
+        saver: ImageSaver,
+        config: Config,
+        page_concurrency: Optional[int] = None,
+        download_concurrency: Optional[int] = None,
+        perceptual_index: Optional[PerceptualIndex] = None,
+    ) -> None:
+        self.parser: WallpapersCraftParser = parser
+        self.saver: ImageSaver = saver
+        self.config: Config = config
+        self.perceptual_index: Optional[PerceptualIndex] = perceptual_index
+        if perceptual_index is None and config.DEDUP_ENABLED:
+            self.perceptual_index = PerceptualIndex(
+                saver.library,
+                config.DEDUP_MAX_DISTANCE,
+                config.DEDUP_RECENT_WINDOW,
+            )
+        self.page_concurrency: int = page_concurrency or config.CRAWL_PAGE_CONCURRENCY
+        self.download_concurrency: int = (
+            download_concurrency or config.MAX_CONCURRENT_DOWNLOADS
+        )
+        self.stats: CrawlStats = CrawlStats()
+        self.completed: List[str] = []
+        self.pages_read: int = 0
+        self._count: Optional[int] = None
+        self._known: AbstractSet[str] = frozenset()
+        self._stop_at_known: bool = False
+        self._reached_known: bool = False
+        self._in_flight: int = 0
+        self._progress: asyncio.Condition = asyncio.Condition()
+
+    def _wanted(self) -> bool:
+        """Whether more wallpapers are needed"""
+        return self._count is None or self.stats.images < self._count
+
+    def _can_start(self) -> bool:
+        """Whether another download may start without overshooting the count"""
+        return self._count is None or self.stats.images + self._in_flight < self._count
+
+    async def _reserve(self) -> bool:
+        """
+        Wait for a download slot within the requested count.
+
+        Only saved wallpapers count as done: while downloads are in flight
+        a worker waits, and takes the slot of one that fails. Returns False
+        once enough wallpapers are saved.
+        """
+        async with self._progress:
+            await self._progress.wait_for(
+                lambda: not self._wanted() or self._can_start()
+            )
+            if not self._wanted():
+                return False
+            self._in_flight += 1
+            return True
+
+    async def _release(self) -> None:
+        """Finish a download started with _reserve"""
+        async with self._progress:
+            self._in_flight -= 1
+            self._progress.notify_all()
+
+    async def run(
+        self,
+        pages: Optional[range] = None,
+        count: Optional[int] = None,
+        known: AbstractSet[str] = frozenset(),
+        stop_at_known: bool = True,
+    ) -> CrawlStats:
+        """
+        Download wallpapers of the current catalog.
+
+        Args:
+            pages: Catalog pages to crawl, all pages by default
+            count: Stop after this many wallpapers are saved
+            known: Wallpaper links that are already in the library
+            stop_at_known: Stop reading pages at the first fully known page
+
+        Returns:
+            Counters of the finished crawl
+        """
+        if pages is None:
+            pages = range(1, await self.parser.get_page_count() + 1)
+
+        self.stats = CrawlStats()
+        self.completed = []
+        self.pages_read = 0
+        self._count = count
+        self._known = known
+        self._stop_at_known = stop_at_known and bool(known)
+        self._reached_known = False
+        self._in_flight = 0
+        self._progress = asyncio.Condition()
+
+        page_queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for page in pages:
+            page_queue.put_nowait(page)
+        link_queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(
+            maxsize=self.download_concurrency * 2
+        )
+
+        async def read_pages() -> None:
+            await asyncio.gather(
+                *(
+                    self._page_worker(page_queue, link_queue)
+                    for _ in range(self.page_concurrency)
+                )
+            )
+            for _ in range(self.download_concurrency):
+                await link_queue.put(None)
+
+        started = time.perf_counter()
+        workers: List["asyncio.Task[None]"] = [asyncio.create_task(read_pages())] + [
+            asyncio.create_task(self._download_worker(link_queue))
+            for _ in range(self.download_concurrency)
+        ]
+        try:
+            # Обе группы работают под общим надзором: фатальная ошибка любой
+            # из них останавливает обход, а не оставляет другую ждать очередь
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                error = task.exception()
+                if error is not None:
+                    raise error
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.stats.elapsed = time.perf_counter() - started
+
+        logger.info(f"Загрузка каталога завершена: {self.stats}")
+        return self.stats
+
+    async def _page_worker(
+        self,
+        page_queue: "asyncio.Queue[int]",
+        link_queue: "asyncio.Queue[Optional[str]]",
+    ) -> None:
+        """Read catalog pages and queue their wallpaper links"""
+        while self._wanted() and not self._reached_known and not page_queue.empty():
+            page = page_queue.get_nowait()
+            try:
+                links = await self.parser.get_catalog_links(
+                    page, revalidate=bool(self._known)
+                )
+            except CircuitOpenError:
+                raise
+            except ParsingError as e:
+                logger.warning(f"Не удалось прочитать страницу {page}: {e}")
+                self.stats.failures += 1
+                continue
+
+            self.pages_read += 1
+            links = tuple(link for link in links if link not in self._known)
+            if not links and self._stop_at_known:
+                logger.info(f"Страница {page} уже загружена, обход остановлен")
+                self._reached_known = True
+                return
+
+            for link in links:
+                if not self._wanted():
+                    return
+                await link_queue.put(link)
+
+    async def _download_worker(
+        self, link_queue: "asyncio.Queue[Optional[str]]"
+    ) -> None:
+        """Download wallpapers from queued links"""
+        while True:
+            link = await link_queue.get()
+            if link is None:
+                return
+            if not await self._reserve():
+                continue
+
+            try:
+                image_path = await self._download(link)
+            except CircuitOpenError:
+                raise
+            except (ParsingError, OSError) as e:
+                logger.warning(f"Не удалось загрузить {link}: {e}")
+                self.stats.failures += 1
+            else:
+                self.completed.append(link)
+                if image_path is not None:
+                    self.stats.images += 1
+                    self.stats.bytes += image_path.stat().st_size
+            finally:
+                await self._release()
+
+    async def _download(self, link: str) -> Optional[Path]:
+        """Download one wallpaper, None if it is already saved"""
+        image_url = await self.parser.get_image_url(link)
+        filename = image_url.split("/")[-1]
+        if (self.saver.output_dir / filename).exists():
+            self.stats.skipped += 1
+            return None
+
+        image_path = await self.saver.save_stream(
+            lambda offset: self.parser.open_image_stream(image_url, offset),
+            filename,
+            attempts=self.config.DOWNLOAD_ATTEMPTS,
+            retry_policy=self.parser.resilience.retry_policy,
+            url=image_url,
+            validate=validate_image,
+            category=self.parser.category,
+            resolution=self.parser.resolution,
+        )
+        if image_path is None:
+            raise ParsingError("Не удалось сохранить изображение")
+
+        # Зеркало каталога сохраняет все обои, хеши нужны для ротации
+        if self.perceptual_index is not None:
+            image_hash = await asyncio.to_thread(dhash, image_path)
+            self.perceptual_index.add(image_path.name, image_hash)
+        return image_path
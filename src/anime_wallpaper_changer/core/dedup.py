@@ -0,0 +1,170 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+import sqlite3
+
+import numpy as np
+from PIL import Image
+
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from anime_wallpaper_changer.core.library import LibraryIndex
+
+logger = setup_logger(__name__)
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+PROXY_SIZE = 64
+
+
+def decode_proxy(img: Image.Image) -> Image.Image:
+    """
+    Small RGB copy of the opened image.
+
+    The image is decoded at reduced size where the format allows it (JPEG
+    draft mode), so large wallpapers are never decoded in full.
+    """
+    img.draft("RGB", (PROXY_SIZE, PROXY_SIZE))
+    proxy = img.convert("RGB")
+    proxy.thumbnail((PROXY_SIZE, PROXY_SIZE))
+    return proxy
+
+
+def dhash(image_path: Path) -> int:
+    """64-bit difference hash of the image file, as the library stores it"""
+    with Image.open(image_path) as img:
+        return dhash_image(decode_proxy(img))
+
+
+def dhash_image(img: Image.Image) -> int:
+    """
+    64-bit difference hash of a decoded image.
+
+    The image is shrunk to 9x8 grayscale and each bit tells whether a pixel
+    is brighter than its right neighbour.
+    """
+    proxy = img.convert("L").resize(
+        (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS
+    )
+    pixels = np.asarray(proxy, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Number of differing bits"""
+    return (first ^ second).bit_count()
+
+
+class MultiIndexHashTable:
+    """
+    Hamming-distance search over 64-bit hashes.
+
+    Hashes are split into ``max_distance + 1`` chunks with one lookup table
+    per chunk. Two hashes within ``max_distance`` bits of each other agree
+    exactly on at least one chunk, so only entries sharing a chunk are
+    compared, instead of the whole index.
+    """
+
+    def __init__(self, max_distance: int) -> None:
+        self.max_distance: int = max_distance
+        chunks = max_distance + 1
+        bounds = [HASH_BITS * i // chunks for i in range(chunks + 1)]
+        self._chunks: List[Tuple[int, int]] = [
+            (start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])
+        ]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._chunks]
+        self._keys: Dict[int, List[str]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._keys.values())
+
+    def add(self, image_hash: int, key: str) -> None:
+        """Add hash of the image with the given key"""
+        keys = self._keys.setdefault(image_hash, [])
+        if key in keys:
+            return
+        if not keys:
+            for (shift, mask), table in zip(self._chunks, self._tables):
+                table.setdefault((image_hash >> shift) & mask, []).append(image_hash)
+        keys.append(key)
+
+    def search(self, image_hash: int) -> List[Tuple[str, int]]:
+        """Keys within max_distance of the hash with their distances"""
+        candidates: Set[int] = set()
+        for (shift, mask), table in zip(self._chunks, self._tables):
+            candidates.update(table.get((image_hash >> shift) & mask, ()))
+
+        matches: List[Tuple[str, int]] = []
+        for candidate in candidates:
+            distance = hamming_distance(image_hash, candidate)
+            if distance <= self.max_distance:
+                matches.extend((key, distance) for key in self._keys[candidate])
+        return matches
+
+
+class PerceptualIndex:
+    """
+    Perceptual hashes of recently saved wallpapers.
+
+    Hashes live in the ``phash`` column of the library index: the last
+    ``recent_window`` downloads are read once, and wallpapers added since are
+    remembered in memory. Every entry gets a sequence number, so a new image
+    is checked against the last ``recent_window`` wallpapers only. Without a
+    library only wallpapers of the current run are known.
+    """
+
+    def __init__(
+        self,
+        library: Optional["LibraryIndex"],
+        max_distance: int,
+        recent_window: int,
+    ) -> None:
+        self.library: Optional["LibraryIndex"] = library
+        self.max_distance: int = max_distance
+        self.recent_window: int = recent_window
+        self._table: Optional[MultiIndexHashTable] = None
+        self._sequence: Dict[str, int] = {}
+        self._next: int = 0
+
+    def _load(self) -> MultiIndexHashTable:
+        """Load recent hashes from the library once"""
+        if self._table is not None:
+            return self._table
+
+        self._table = MultiIndexHashTable(self.max_distance)
+        if self.library is not None:
+            try:
+                for key, image_hash in self.library.recent_hashes(self.recent_window):
+                    self._remember(key, image_hash)
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось прочитать хеши похожих изображений: {e}")
+        return self._table
+
+    def _remember(self, key: str, image_hash: int) -> None:
+        assert self._table is not None
+        self._table.add(image_hash, key)
+        self._sequence[key] = self._next
+        self._next += 1
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def find_recent(self, image_hash: int) -> Optional[str]:
+        """Recently saved wallpaper that looks the same, if any"""
+        oldest = self._next - self.recent_window
+        for key, distance in sorted(
+            self._load().search(image_hash), key=lambda match: match[1]
+        ):
+            if self._sequence.get(key, -1) >= oldest:
+                return key
+        return None
+
+    def add(self, key: str, image_hash: int) -> None:
+        """
+        Remember perceptual hash of the saved wallpaper.
+
+        The library stores the same hash itself when the wallpaper is indexed.
+        """
+        self._load()
+        self._remember(key, image_hash)
@@ -1,19 +1,397 @@
-from typing import Dict, Callable, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Callable, List, Optional, Sequence, Tuple
 from pathlib import Path
-import io
+import threading
 
-from PIL import Image, ImageEnhance, ImageFilter
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
 
 from anime_wallpaper_changer.utils.logger import setup_logger
+from anime_wallpaper_changer.utils.storage import atomic_write
 
 logger = setup_logger(__name__)
 
+PreviewKey = Tuple[str, int, int]
+EffectLayer = Tuple[str, float]
+
+EFFECT_BACKENDS = ("pillow", "numpy")
+# Rows of a frame converted to float at once by the NumPy backend
+NUMPY_CHUNK_ROWS = 16
+# Bytes of a frame passed through a lookup table at once
+NUMPY_LUT_CHUNK = 1 << 16
+
+# Affine color transform: out = matrix @ rgb + offset
+ColorTransform = Tuple[np.ndarray, np.ndarray]
+
+# ITU-R 601-2 luma, as used by PIL for "L" conversion
+LUMA = np.array([0.299, 0.587, 0.114])
+IDENTITY = np.eye(3)
+
+
+def brightness_transform(factor: float, mean_luma: float) -> ColorTransform:
+    """Scale towards black, as ImageEnhance.Brightness."""
+    return IDENTITY * factor, np.zeros(3)
+
+
+def contrast_transform(factor: float, mean_luma: float) -> ColorTransform:
+    """Scale around mean gray, as ImageEnhance.Contrast."""
+    return IDENTITY * factor, np.full(3, (1.0 - factor) * int(mean_luma + 0.5))
+
+
+def saturation_transform(factor: float, mean_luma: float) -> ColorTransform:
+    """Scale away from per-pixel gray, as ImageEnhance.Color."""
+    gray = np.outer(np.ones(3), LUMA)
+    return IDENTITY * factor + (1.0 - factor) * gray, np.zeros(3)
+
+
+def compose_point_effects(
+    layers: Sequence[EffectLayer], mean_rgb: Callable[[], np.ndarray]
+) -> ColorTransform:
+    """Multiply the color transforms of consecutive point effects into one.
+
+    Contrast depends on the mean gray of its input, which is derived from
+    the mean color of the source image through the preceding transforms;
+    ``mean_rgb`` is only called when the layers include contrast.
+    Intermediate results are not clipped, unlike a chain of separate effects.
+    """
+    matrix, offset = IDENTITY, np.zeros(3)
+    source_mean: Optional[np.ndarray] = None
+    for name, intensity in layers:
+        mean_luma = 0.0
+        if name == "Контраст":
+            if source_mean is None:
+                source_mean = mean_rgb()
+            mean_luma = float(LUMA @ (matrix @ source_mean + offset))
+        step_matrix, step_offset = POINT_EFFECTS[name](intensity, mean_luma)
+        matrix, offset = step_matrix @ matrix, step_matrix @ offset + step_offset
+    return matrix, offset
+
+
+def channel_luts(transform: ColorTransform) -> Optional[np.ndarray]:
+    """256-entry lookup table per channel, or None if channels are mixed."""
+    matrix, offset = transform
+    if np.count_nonzero(matrix - np.diag(np.diagonal(matrix))):
+        return None
+    levels = np.arange(256)
+    luts = np.outer(np.diagonal(matrix), levels) + offset[:, np.newaxis]
+    table: np.ndarray = np.clip(np.rint(luts), 0, 255).astype(np.uint8)
+    return table
+
+
+def shared_mix(matrix: np.ndarray) -> Optional[Tuple[float, np.ndarray]]:
+    """Split ``matrix`` into ``scale * I + ones ⊗ weights`` if possible.
+
+    Products of brightness, contrast and saturation always have this form,
+    which costs one dot product per pixel instead of a full matrix product.
+    """
+    weights = matrix[(np.arange(3) + 1) % 3, np.arange(3)]
+    scale = float(matrix[0, 0] - weights[0])
+    if not np.allclose(IDENTITY * scale + np.outer(np.ones(3), weights), matrix):
+        return None
+    return scale, weights
+
+
+def fuse_point_effects(img: Image.Image, layers: Sequence[EffectLayer]) -> Image.Image:
+    """Apply consecutive point effects to an RGB image in a single pass.
+
+    Per-channel transforms run as a lookup table, mixing ones as a matrix
+    conversion.
+    """
+    transform = compose_point_effects(
+        layers, lambda: np.array(ImageStat.Stat(img).mean[:3])
+    )
+    luts = channel_luts(transform)
+    if luts is not None:
+        return img.point(luts.ravel().tolist())
+    matrix, offset = transform
+    return img.convert("RGB", tuple(np.column_stack([matrix, offset]).ravel()))
+
+
+def image_to_array(img: Image.Image) -> np.ndarray:
+    """Writable height x width x 3 copy of the image pixels."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.array(img)
+
+
+def array_mean(pixels: np.ndarray) -> np.ndarray:
+    """Mean color of an RGB array, summing whole rows at a time."""
+    columns = pixels.sum(axis=0, dtype=np.uint32)
+    mean: np.ndarray = columns.sum(axis=0, dtype=np.uint64) / (
+        pixels.shape[0] * pixels.shape[1]
+    )
+    return mean
+
+
+def apply_lut_inplace(pixels: np.ndarray, lut: np.ndarray) -> None:
+    """Pass every byte of a contiguous array through one lookup table."""
+    flat = pixels.reshape(-1)
+    for start in range(0, flat.size, NUMPY_LUT_CHUNK):
+        chunk = flat[start : start + NUMPY_LUT_CHUNK]
+        np.take(lut, chunk, out=chunk, mode="clip")
+
+
+def mix_channels_inplace(pixels: np.ndarray, transform: ColorTransform) -> None:
+    """Apply a channel-mixing transform to every pixel of an RGB array.
+
+    Works through a few rows at a time, so the float scratch stays small.
+    """
+    matrix, offset = transform
+    mix = shared_mix(matrix)
+    # +0.5 rounds when the result is truncated back to bytes
+    offset32 = (offset + 0.5).astype(np.float32)
+    matrix32 = matrix.T.astype(np.float32)
+    for start in range(0, len(pixels), NUMPY_CHUNK_ROWS):
+        rows = pixels[start : start + NUMPY_CHUNK_ROWS]
+        values = rows.astype(np.float32)
+        if mix is not None:
+            scale, weights = mix
+            shared = values @ weights.astype(np.float32)
+            values *= scale
+            values += shared[..., np.newaxis]
+        else:
+            values = values @ matrix32
+        values += offset32
+        np.clip(values, 0, 255, out=values)
+        rows[...] = values
+
+
+def fuse_point_effects_inplace(
+    pixels: np.ndarray, layers: Sequence[EffectLayer]
+) -> None:
+    """Apply consecutive point effects to an RGB array in place.
+
+    Brightness and contrast run as a 256-entry lookup table over the bytes
+    of the frame, saturation as a per-pixel channel mix.
+    """
+    transform = compose_point_effects(layers, lambda: array_mean(pixels))
+    luts = channel_luts(transform)
+    if luts is None:
+        mix_channels_inplace(pixels, transform)
+    elif (luts == luts[0]).all():
+        apply_lut_inplace(pixels, luts[0])
+    else:
+        for channel in range(3):
+            plane = pixels[..., channel]
+            np.take(luts[channel], plane, out=plane, mode="clip")
+
+
+POINT_EFFECTS: Dict[str, Callable[[float, float], ColorTransform]] = {
+    "Яркость": brightness_transform,
+    "Контраст": contrast_transform,
+    "Насыщенность": saturation_transform,
+}
+
+
+@dataclass(frozen=True)
+class EffectStack:
+    """Ordered effects applied to an image in one go.
+
+    Runs of point effects (brightness, contrast, saturation) are fused into
+    one pass over the pixels; other effects run between them in order.
+    """
+
+    layers: Tuple[EffectLayer, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.layers)
+
+    def __len__(self) -> int:
+        return len(self.layers)
+
+    def push(self, effect_name: str, intensity: float) -> "EffectStack":
+        """Stack with one more effect on top."""
+        return EffectStack(self.layers + ((effect_name, intensity),))
+
+    def unknown_effects(self) -> List[str]:
+        """Names of effects that are not available."""
+        return [name for name, _ in self.layers if name not in ImageEffect.EFFECTS]
+
+    def render(self, img: Image.Image, backend: str = "pillow") -> Image.Image:
+        """Apply all effects to the image, returning a new RGB image.
+
+        Args:
+            img: Source image, left unchanged
+            backend: "pillow" or "numpy"
+
+        Returns:
+            Image: Processed image
+        """
+        if backend == "numpy":
+            pixels = image_to_array(img)
+            self.render_array(pixels)
+            return Image.fromarray(pixels)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        points: List[EffectLayer] = []
+        for name, intensity in self.layers:
+            if name in POINT_EFFECTS:
+                points.append((name, intensity))
+                continue
+            if points:
+                img = fuse_point_effects(img, points)
+                points = []
+            img = ImageEffect.EFFECTS[name](img, intensity)
+        if points:
+            img = fuse_point_effects(img, points)
+        return img
+
+    def render_array(self, pixels: np.ndarray) -> None:
+        """Apply all effects in place to a contiguous RGB array.
+
+        Point effects only need row-sized scratch. Blur and sharpness have
+        no NumPy kernels and go through Pillow, copying the result back.
+        """
+        points: List[EffectLayer] = []
+        for name, intensity in self.layers:
+            if name in POINT_EFFECTS:
+                points.append((name, intensity))
+                continue
+            if points:
+                fuse_point_effects_inplace(pixels, points)
+                points = []
+            effect = ImageEffect.EFFECTS[name]
+            pixels[...] = np.asarray(effect(Image.fromarray(pixels), intensity))
+        if points:
+            fuse_point_effects_inplace(pixels, points)
+
+
+@dataclass(frozen=True)
+class PreviewFrame:
+    """Raw pixels of a rendered preview.
+
+    Rows of ``width`` pixels in ``mode`` ("RGB" or "RGBA") follow each other
+    every ``stride`` bytes, ready to be wrapped by a GUI image without
+    decoding. The memoryview keeps the underlying buffer alive.
+    """
+
+    data: memoryview
+    width: int
+    height: int
+    stride: int
+    mode: str
+
+    @classmethod
+    def from_array(cls, pixels: np.ndarray) -> "PreviewFrame":
+        """Frame viewing the pixels of an RGB or RGBA array without copying."""
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        height, width, channels = pixels.shape
+        return cls(
+            data=memoryview(pixels).cast("B"),
+            width=width,
+            height=height,
+            stride=pixels.strides[0],
+            mode="RGBA" if channels == 4 else "RGB",
+        )
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "PreviewFrame":
+        """Frame of a Pillow image.
+
+        Pillow does not expose its pixel memory, so the pixels are copied
+        once into the frame buffer.
+        """
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        return cls(
+            data=memoryview(img.tobytes()),
+            width=img.width,
+            height=img.height,
+            stride=img.width * len(img.mode),
+            mode=img.mode,
+        )
+
+
+class PreviewCache:
+    """
+    LRU cache of decoded, downscaled preview images.
+
+    Entries are keyed by path, modification time and size, so a changed
+    file is decoded again. The least recently used proxies are dropped once
+    their pixel buffers take more than ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, size: Tuple[int, int]) -> None:
+        self.max_bytes = max_bytes
+        self.size = size
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[PreviewKey, Image.Image]" = OrderedDict()
+        self._keys: Dict[str, PreviewKey] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(image_path: Path) -> PreviewKey:
+        stat = image_path.stat()
+        return str(image_path.resolve()), stat.st_mtime_ns, stat.st_size
+
+    def get(self, image_path: Path) -> Image.Image:
+        """Get RGB proxy of the image, decoding it on a miss.
+
+        The returned image is shared and must not be modified in place.
+        """
+        key = self._key(image_path)
+        with self._lock:
+            proxy = self._entries.get(key)
+            if proxy is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return proxy
+            self.misses += 1
+
+        proxy = self._decode(image_path)
+        with self._lock:
+            self._put(key, proxy)
+        return proxy
+
+    def _decode(self, image_path: Path) -> Image.Image:
+        with Image.open(image_path) as img:
+            img.thumbnail(self.size, Image.Resampling.LANCZOS)
+            return img.convert("RGB")
+
+    def _put(self, key: PreviewKey, proxy: Image.Image) -> None:
+        stale = self._keys.get(key[0])
+        if stale is not None and stale != key:
+            self._drop(stale)
+        nbytes = self._nbytes(proxy)
+        if key in self._entries or nbytes > self.max_bytes:
+            return
+        self._entries[key] = proxy
+        self._keys[key[0]] = key
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: PreviewKey) -> None:
+        proxy = self._entries.pop(key, None)
+        if proxy is not None:
+            self.nbytes -= self._nbytes(proxy)
+        if self._keys.get(key[0]) == key:
+            del self._keys[key[0]]
+
+    @staticmethod
+    def _nbytes(proxy: Image.Image) -> int:
+        return proxy.width * proxy.height * len(proxy.getbands())
+
+    def clear(self) -> None:
+        """Drop all cached previews."""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self.nbytes = 0
+
 
 class ImageEffect:
     """Class for applying effects to images."""
 
     # Constants
     PREVIEW_SIZE = (600, 300)
+    PREVIEW_CACHE_BYTES = 32 * 1024 * 1024
     JPEG_QUALITY = 95
 
     EFFECTS: Dict[str, Callable[[Image.Image, float], Image.Image]] = {
@@ -26,6 +404,21 @@ class ImageEffect:
         "Насыщенность": lambda img, value: ImageEnhance.Color(img).enhance(value),
     }
 
+    preview_cache = PreviewCache(PREVIEW_CACHE_BYTES, PREVIEW_SIZE)
+    backend = "pillow"
+
+    @staticmethod
+    def set_backend(backend: str) -> None:
+        """Select the implementation of effects.
+
+        Args:
+            backend: "pillow" (Pillow image operations) or "numpy"
+                (in-place NumPy kernels)
+        """
+        if backend not in EFFECT_BACKENDS:
+            raise ValueError(f"Unknown effect backend: {backend}")
+        ImageEffect.backend = backend
+
     @staticmethod
     def apply_effect(
         image_path: Path,
@@ -41,40 +434,80 @@ class ImageEffect:
             intensity: Effect intensity (0.0 - 2.0)
             output_path: Path to save result (if None, overwrites source)
 
+        Returns:
+            Path: Path to processed image or None if error occurs
+        """
+        return ImageEffect.apply_stack(
+            image_path, EffectStack().push(effect_name, intensity), output_path
+        )
+
+    @staticmethod
+    def apply_stack(
+        image_path: Path,
+        stack: EffectStack,
+        output_path: Optional[Path] = None,
+        fsync: str = "always",
+    ) -> Optional[Path]:
+        """Apply a stack of effects with one decode and one encode.
+
+        Args:
+            image_path: Path to source image
+            stack: Effects to apply in order
+            output_path: Path to save result (if None, overwrites source)
+            fsync: Flush mode of the atomic write, as in utils.storage
+
         Returns:
             Path: Path to processed image or None if error occurs
         """
         try:
-            if effect_name not in ImageEffect.EFFECTS:
-                logger.error(f"Unknown effect: {effect_name}")
+            unknown = stack.unknown_effects()
+            if unknown:
+                logger.error(f"Unknown effect: {', '.join(unknown)}")
                 return None
 
-            with Image.open(image_path) as img:
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
-
-                effect_func = ImageEffect.EFFECTS[effect_name]
-                processed_img = effect_func(img, intensity)
+            processed_img = ImageEffect._render_file(image_path, stack)
 
-                save_path = output_path or image_path
-                processed_img.save(save_path, "JPEG", quality=ImageEffect.JPEG_QUALITY)
+            save_path = output_path or image_path
+            # Write a new file instead of truncating the old one: saved
+            # wallpapers may be hard links into the content store
+            with atomic_write(save_path, "wb", fsync) as file:
+                processed_img.save(file, "JPEG", quality=ImageEffect.JPEG_QUALITY)
 
-                logger.info(f"Effect {effect_name} successfully applied")
-                return save_path
+            logger.info(f"Effects applied: {ImageEffect.describe(stack)}")
+            return save_path
 
         except Exception as e:
-            logger.error(f"Error applying effect {effect_name}: {e}")
+            logger.error(f"Error applying effects {ImageEffect.describe(stack)}: {e}")
             return None
 
+    @staticmethod
+    def _render_file(image_path: Path, stack: EffectStack) -> Image.Image:
+        """Decode the image and apply the stack with the selected backend."""
+        if ImageEffect.backend != "numpy":
+            with Image.open(image_path) as img:
+                return stack.render(img)
+
+        # The decoded image is released before the effects run, so the
+        # array is the only copy of the frame until the result is built
+        with Image.open(image_path) as img:
+            pixels = image_to_array(img)
+        stack.render_array(pixels)
+        return Image.fromarray(pixels)
+
     @staticmethod
     def get_available_effects() -> list[str]:
         """Get list of available effects."""
         return list(ImageEffect.EFFECTS.keys())
 
+    @staticmethod
+    def describe(stack: EffectStack) -> str:
+        """Human-readable list of stacked effects."""
+        return ", ".join(f"{name} {value:.2f}" for name, value in stack.layers)
+
     @staticmethod
     def preview_effect(
         image_path: Path, effect_name: str, intensity: float = 1.0
-    ) -> Optional[bytes]:
+    ) -> Optional[PreviewFrame]:
         """Create effect preview without saving.
 
         Args:
@@ -83,26 +516,43 @@ class ImageEffect:
             intensity: Effect intensity (0.0 - 2.0)
 
         Returns:
-            bytes: Preview binary data or None if error occurs
+            PreviewFrame: Preview pixels or None if error occurs
         """
-        try:
-            if effect_name not in ImageEffect.EFFECTS:
-                logger.error(f"Unknown effect: {effect_name}")
-                return None
+        return ImageEffect.preview_stack(
+            image_path, EffectStack().push(effect_name, intensity)
+        )
 
-            with Image.open(image_path) as img:
-                img.thumbnail(ImageEffect.PREVIEW_SIZE, Image.Resampling.LANCZOS)
+    @staticmethod
+    def preview_stack(image_path: Path, stack: EffectStack) -> Optional[PreviewFrame]:
+        """Create preview of a stack of effects without saving.
 
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
+        The downscaled image is taken from the preview cache, so repeated
+        previews of the same file only run the effects. The result is the
+        raw pixel buffer, with no encoding round-trip: the NumPy backend
+        hands over its working array as is, Pillow results are copied once.
 
-                effect_func = ImageEffect.EFFECTS[effect_name]
-                processed_img = effect_func(img, intensity)
+        Args:
+            image_path: Path to source image
+            stack: Effects to apply in order
+
+        Returns:
+            PreviewFrame: Preview pixels or None if error occurs
+        """
+        try:
+            unknown = stack.unknown_effects()
+            if unknown:
+                logger.error(f"Unknown effect: {', '.join(unknown)}")
+                return None
 
-                buffer = io.BytesIO()
-                processed_img.save(buffer, format="JPEG")
-                return buffer.getvalue()
+            img = ImageEffect.preview_cache.get(image_path)
+            if ImageEffect.backend == "numpy":
+                pixels = image_to_array(img)
+                stack.render_array(pixels)
+                return PreviewFrame.from_array(pixels)
+            return PreviewFrame.from_image(stack.render(img))
 
         except Exception as e:
-            logger.error(f"Error creating preview for effect {effect_name}: {e}")
+            logger.error(
+                f"Error creating preview for {ImageEffect.describe(stack)}: {e}"
+            )
             return None
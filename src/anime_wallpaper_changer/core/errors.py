@@ -0,0 +1,30 @@
+from typing import Optional
+
+
+class ParsingError(Exception):
+    """Base exception for parsing errors"""
+
+    pass
+
+
+class TransientError(ParsingError):
+    """Temporary failure worth retrying: timeout, connection error or HTTP 5xx"""
+
+    pass
+
+
+class CircuitOpenError(ParsingError):
+    """Requests are not sent because the site keeps failing"""
+
+    pass
+
+
+class ThrottledError(TransientError):
+    """Site asked to slow down: HTTP 429 or 5xx, possibly with Retry-After"""
+
+    def __init__(
+        self, message: str, status: int, retry_after: Optional[float] = None
+    ) -> None:
+        super().__init__(message)
+        self.status: int = status
+        self.retry_after: Optional[float] = retry_after
@@ -0,0 +1,73 @@
+from types import TracebackType
+from typing import Optional, Type
+
+import aiohttp
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class HttpClient:
+    """
+    Long-lived HTTP client shared by the parser and the downloads.
+
+    Keeps a single aiohttp session with a keep-alive connection pool and
+    a DNS cache, so consecutive requests to the wallpaper site reuse open
+    TCP/TLS connections instead of paying for a new handshake each time.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self.config: Config = config
+        self._session: Optional[ClientSession] = None
+        self._shut_down: bool = False
+
+    @property
+    def session(self) -> ClientSession:
+        """Get the shared session, creating it on first use"""
+        if self._shut_down:
+            raise RuntimeError("HTTP client is closed")
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    @property
+    def closed(self) -> bool:
+        """Whether the client has no open session"""
+        return self._session is None or self._session.closed
+
+    def _create_session(self) -> ClientSession:
+        """Create session with a pooled connector"""
+        connector = TCPConnector(
+            limit=self.config.HTTP_CONNECTION_LIMIT,
+            limit_per_host=self.config.CONCURRENCY_MAX,
+            ttl_dns_cache=self.config.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=self.config.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = ClientTimeout(
+            total=self.config.HTTP_TOTAL_TIMEOUT,
+            sock_connect=self.config.HTTP_CONNECT_TIMEOUT,
+        )
+        logger.info("Создана общая HTTP-сессия")
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        """Close the session and release all pooled connections"""
+        self._shut_down = True
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP-сессия закрыта")
+        self._session = None
+
+    async def __aenter__(self) -> "HttpClient":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
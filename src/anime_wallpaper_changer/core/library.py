@@ -0,0 +1,412 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Collection, Iterable, List, Optional, Tuple
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from anime_wallpaper_changer.core.dedup import decode_proxy, dhash_image
+from anime_wallpaper_changer.core.store import file_digest
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+LIBRARY_FILE_NAME = ".library.sqlite3"
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    url TEXT,
+    category TEXT,
+    resolution TEXT,
+    sha256 TEXT NOT NULL,
+    phash TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    downloaded_at REAL NOT NULL,
+    shown_count INTEGER NOT NULL DEFAULT 0,
+    last_shown_at REAL,
+    mean_luma REAL NOT NULL,
+    contrast REAL NOT NULL,
+    mean_red REAL NOT NULL,
+    mean_green REAL NOT NULL,
+    mean_blue REAL NOT NULL,
+    favourite INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS images_catalog ON images (category, resolution);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+CREATE INDEX IF NOT EXISTS images_url ON images (url);
+"""
+
+# Порядок вытеснения: первыми удаляются обои в начале списка
+EVICTION_ORDERS = {
+    "lru": "COALESCE(last_shown_at, downloaded_at)",
+    "lfu": "shown_count, COALESCE(last_shown_at, downloaded_at)",
+    "oldest": "downloaded_at",
+}
+
+
+@dataclass(frozen=True)
+class DiskQuota:
+    """
+    Limit on the size of the wallpaper library.
+
+    Either limit may be None. The policy decides which wallpapers go first:
+    ``lru`` - shown longest ago, ``lfu`` - shown least often, ``oldest`` -
+    downloaded first. Wallpapers never shown count as shown when downloaded.
+    """
+
+    max_bytes: Optional[int] = None
+    max_files: Optional[int] = None
+    policy: str = "lru"
+
+    def __post_init__(self) -> None:
+        if self.policy not in EVICTION_ORDERS:
+            raise ValueError(f"Unknown eviction policy: {self.policy}")
+
+    def exceeded(self, files: int, size: int) -> bool:
+        """Whether the library is over the quota"""
+        return (self.max_files is not None and files > self.max_files) or (
+            self.max_bytes is not None and size > self.max_bytes
+        )
+
+
+@dataclass(frozen=True)
+class ImageStats:
+    """Properties of an image computed once when it is indexed"""
+
+    width: int
+    height: int
+    phash: int
+    mean_luma: float
+    contrast: float
+    mean_rgb: Tuple[float, float, float]
+
+
+def analyze_image(image_path: Path) -> ImageStats:
+    """
+    Compute image statistics from a small decoded proxy.
+
+    Brightness is the mean Rec. 601 luma (0-255), contrast its standard
+    deviation. The proxy is the one the perceptual hash is computed from.
+    """
+    with Image.open(image_path) as img:
+        width, height = img.size
+        proxy = decode_proxy(img)
+
+    pixels = np.asarray(proxy, dtype=np.float32).reshape(-1, 3)
+    luma = pixels @ LUMA_WEIGHTS
+    red, green, blue = (float(value) for value in pixels.mean(axis=0))
+    return ImageStats(
+        width=width,
+        height=height,
+        phash=dhash_image(proxy),
+        mean_luma=float(luma.mean()),
+        contrast=float(luma.std()),
+        mean_rgb=(red, green, blue),
+    )
+
+
+@dataclass(frozen=True)
+class LibraryEntry:
+    """Indexed wallpaper of the local library"""
+
+    name: str
+    url: Optional[str]
+    category: Optional[str]
+    resolution: Optional[str]
+    sha256: str
+    phash: int
+    width: int
+    height: int
+    size: int
+    mtime: float
+    downloaded_at: float
+    shown_count: int
+    last_shown_at: Optional[float]
+    mean_luma: float
+    contrast: float
+    mean_rgb: Tuple[float, float, float]
+    favourite: bool
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "LibraryEntry":
+        return cls(
+            name=row["name"],
+            url=row["url"],
+            category=row["category"],
+            resolution=row["resolution"],
+            sha256=row["sha256"],
+            phash=int(row["phash"], 16),
+            width=row["width"],
+            height=row["height"],
+            size=row["size"],
+            mtime=row["mtime"],
+            downloaded_at=row["downloaded_at"],
+            shown_count=row["shown_count"],
+            last_shown_at=row["last_shown_at"],
+            mean_luma=row["mean_luma"],
+            contrast=row["contrast"],
+            mean_rgb=(row["mean_red"], row["mean_green"], row["mean_blue"]),
+            favourite=bool(row["favourite"]),
+        )
+
+
+@dataclass
+class RescanResult:
+    """Changes found by a library rescan"""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"added={self.added}, updated={self.updated}, "
+            f"removed={self.removed}, unchanged={self.unchanged}"
+        )
+
+
+class LibraryIndex:
+    """
+    SQLite index of the wallpapers in the output folder.
+
+    Stores where each wallpaper came from, its content hash, size,
+    dimensions, precomputed statistics and how often it was shown, so other
+    features can query the library instead of walking and decoding files.
+    Methods block and are meant to be called through asyncio.to_thread;
+    a lock serializes access to the shared connection.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path: Path = db_path
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._migrate(connection)
+            connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection) -> None:
+        """Upgrade index created by an older version"""
+        columns = {
+            row["name"] for row in connection.execute("PRAGMA table_info(images)")
+        }
+        if "favourite" not in columns:
+            connection.execute(
+                "ALTER TABLE images ADD COLUMN favourite INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def _execute(self, sql: str, parameters: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        """Run a statement in its own transaction"""
+        with self._lock, self.connection as connection:
+            return connection.execute(sql, tuple(parameters)).fetchall()
+
+    def add(
+        self,
+        image_path: Path,
+        url: Optional[str] = None,
+        category: Optional[str] = None,
+        resolution: Optional[str] = None,
+        sha256: Optional[str] = None,
+    ) -> None:
+        """
+        Index the wallpaper file, replacing the entry with the same name.
+
+        Source fields that are not given keep their previous values, and the
+        show counters are kept.
+        """
+        stat = image_path.stat()
+        stats = analyze_image(image_path)
+        digest = sha256 or file_digest(image_path)
+        self._execute(
+            """
+            INSERT INTO images (
+                name, url, category, resolution, sha256, phash, width, height,
+                size, mtime, downloaded_at, mean_luma, contrast,
+                mean_red, mean_green, mean_blue
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                url = COALESCE(excluded.url, url),
+                category = COALESCE(excluded.category, category),
+                resolution = COALESCE(excluded.resolution, resolution),
+                sha256 = excluded.sha256,
+                phash = excluded.phash,
+                width = excluded.width,
+                height = excluded.height,
+                size = excluded.size,
+                mtime = excluded.mtime,
+                mean_luma = excluded.mean_luma,
+                contrast = excluded.contrast,
+                mean_red = excluded.mean_red,
+                mean_green = excluded.mean_green,
+                mean_blue = excluded.mean_blue
+            """,
+            (
+                image_path.name,
+                url,
+                category,
+                resolution,
+                digest,
+                f"{stats.phash:016x}",
+                stats.width,
+                stats.height,
+                stat.st_size,
+                stat.st_mtime,
+                time.time(),
+                stats.mean_luma,
+                stats.contrast,
+                *stats.mean_rgb,
+            ),
+        )
+
+    def remove(self, name: str) -> None:
+        """Forget the wallpaper"""
+        self._execute("DELETE FROM images WHERE name = ?", (name,))
+
+    def record_shown(self, name: str) -> None:
+        """Count that the wallpaper was set as desktop background"""
+        self._execute(
+            "UPDATE images SET shown_count = shown_count + 1, last_shown_at = ? "
+            "WHERE name = ?",
+            (time.time(), name),
+        )
+
+    def set_favourite(self, name: str, favourite: bool) -> None:
+        """Mark the wallpaper as favourite, protecting it from eviction"""
+        self._execute(
+            "UPDATE images SET favourite = ? WHERE name = ?", (int(favourite), name)
+        )
+
+    def usage(self, by_content: bool = False) -> Tuple[int, int]:
+        """
+        Number of wallpapers and bytes they take.
+
+        With ``by_content`` wallpapers with the same content hash are counted
+        once, as they share one file in the content store.
+        """
+        files, size = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+        )[0]
+        if by_content:
+            size = self._execute(
+                "SELECT COALESCE(SUM(size), 0) FROM "
+                "(SELECT MAX(size) AS size FROM images GROUP BY sha256)"
+            )[0][0]
+        return int(files), int(size)
+
+    def next_to_evict(
+        self, policy: str, protected: Collection[str] = ()
+    ) -> Optional[LibraryEntry]:
+        """
+        Wallpaper to delete first under the eviction policy.
+
+        Favourites, the protected names and the wallpaper shown last are
+        never returned.
+        """
+        placeholders = ", ".join("?" for _ in protected)
+        rows = self._execute(
+            f"""
+            SELECT * FROM images
+            WHERE favourite = 0
+                AND name NOT IN ({placeholders})
+                AND name IS NOT (
+                    SELECT name FROM images WHERE last_shown_at IS NOT NULL
+                    ORDER BY last_shown_at DESC LIMIT 1
+                )
+            ORDER BY {EVICTION_ORDERS[policy]}
+            LIMIT 1
+            """,
+            protected,
+        )
+        return LibraryEntry.from_row(rows[0]) if rows else None
+
+    def get(self, name: str) -> Optional[LibraryEntry]:
+        """Entry of the wallpaper with the given file name"""
+        rows = self._execute("SELECT * FROM images WHERE name = ?", (name,))
+        return LibraryEntry.from_row(rows[0]) if rows else None
+
+    def find_by_hash(self, sha256: str) -> List[LibraryEntry]:
+        """Wallpapers with the given content hash"""
+        rows = self._execute("SELECT * FROM images WHERE sha256 = ?", (sha256,))
+        return [LibraryEntry.from_row(row) for row in rows]
+
+    def recent_hashes(self, limit: int) -> List[Tuple[str, int]]:
+        """Perceptual hashes of the last downloaded wallpapers, oldest first"""
+        rows = self._execute(
+            "SELECT name, phash FROM images ORDER BY downloaded_at DESC LIMIT ?",
+            (limit,),
+        )
+        return [(row["name"], int(row["phash"], 16)) for row in reversed(rows)]
+
+    def query(
+        self, category: Optional[str] = None, resolution: Optional[str] = None
+    ) -> List[LibraryEntry]:
+        """Wallpapers of the category and resolution, all by default"""
+        conditions, parameters = [], []
+        if category is not None:
+            conditions.append("category = ?")
+            parameters.append(category)
+        if resolution is not None:
+            conditions.append("resolution = ?")
+            parameters.append(resolution)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._execute(f"SELECT * FROM images{where}", parameters)
+        return [LibraryEntry.from_row(row) for row in rows]
+
+    def __len__(self) -> int:
+        return int(self._execute("SELECT COUNT(*) FROM images")[0][0])
+
+    def rescan(self, image_paths: Iterable[Path]) -> RescanResult:
+        """
+        Bring the index in line with the files in the folder.
+
+        Only new files and files whose size or mtime changed are hashed and
+        analyzed; entries of missing files are removed.
+        """
+        result = RescanResult()
+        known = {
+            row["name"]: (row["size"], row["mtime"])
+            for row in self._execute("SELECT name, size, mtime FROM images")
+        }
+
+        for image_path in image_paths:
+            try:
+                stat = image_path.stat()
+                previous = known.pop(image_path.name, None)
+                if previous == (stat.st_size, stat.st_mtime):
+                    result.unchanged += 1
+                    continue
+                self.add(image_path)
+            except (OSError, Image.DecompressionBombError, SyntaxError) as e:
+                logger.warning(f"Не удалось проиндексировать {image_path}: {e}")
+                continue
+            if previous is None:
+                result.added += 1
+            else:
+                result.updated += 1
+
+        for name in known:
+            self.remove(name)
+            result.removed += 1
+        return result
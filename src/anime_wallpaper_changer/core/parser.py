@@ -1,21 +1,224 @@
 from abc import ABC, abstractmethod
-from typing import Optional, cast
-import random
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, Optional, Set, Tuple, Union
+import asyncio
+import re
 
-import aiohttp
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup, Tag
+from aiohttp import ClientError, ClientResponse
+from lxml import etree
 
+from anime_wallpaper_changer.core.cache import (
+    CatalogCache,
+    CatalogPage,
+    ImageUrlIndex,
+    PageCountCache,
+)
 from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.errors import (
+    CircuitOpenError,
+    ParsingError,
+    ThrottledError,
+    TransientError,
+)
+from anime_wallpaper_changer.core.http import HttpClient
+from anime_wallpaper_changer.core.ratelimit import (
+    AimdLimiter,
+    RateLimiter,
+    TokenBucket,
+    parse_retry_after,
+)
+from anime_wallpaper_changer.core.resilience import (
+    CircuitBreaker,
+    HedgeBudget,
+    LatencyTracker,
+    ResilientCaller,
+    RetryPolicy,
+)
+from anime_wallpaper_changer.core.sampler import CatalogSampler
 from anime_wallpaper_changer.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+PAGE_NUMBER_PATTERN = re.compile(r"/page(\d+)/?$")
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
 
-class ParsingError(Exception):
-    """Base exception for parsing errors"""
 
-    pass
+class ElementCollector:
+    """
+    lxml parser target collecting one attribute of elements with a CSS class.
+
+    Receives tag events only, so no document tree is built and the result is
+    a tuple of plain strings. Collection is done after ``limit`` values or
+    once the element with ``container_class`` is closed, which lets a
+    streaming reader stop before the rest of the page arrives.
+    """
+
+    def __init__(
+        self,
+        css_class: str,
+        attribute: str,
+        limit: Optional[int] = None,
+        container_class: Optional[str] = None,
+    ) -> None:
+        self.css_class: str = css_class
+        self.attribute: str = attribute
+        self.limit: Optional[int] = limit
+        self.container_class: Optional[str] = container_class
+        self.values: list[str] = []
+        self._depth: int = 0
+        self._container_depth: Optional[int] = None
+        self._container_closed: bool = False
+
+    @property
+    def done(self) -> bool:
+        """Whether collection is complete"""
+        if self._container_closed:
+            return True
+        return self.limit is not None and len(self.values) >= self.limit
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        self._depth += 1
+        if self.done:
+            return
+        classes = attrib.get("class")
+        if not classes:
+            return
+        class_names = classes.split()
+        if self.css_class in class_names:
+            value = attrib.get(self.attribute)
+            if value:
+                self.values.append(value)
+        if (
+            self._container_depth is None
+            and self.container_class is not None
+            and self.container_class in class_names
+        ):
+            self._container_depth = self._depth
+
+    def end(self, tag: str) -> None:
+        if self._container_depth == self._depth:
+            self._container_closed = True
+            self._container_depth = None
+        self._depth -= 1
+
+    def close(self) -> Tuple[str, ...]:
+        return tuple(self.values)
+
+
+class CollectorGroup:
+    """
+    lxml parser target feeding tag events to several collectors at once.
+
+    Done when every collector is done; the values are read from the
+    collectors themselves.
+    """
+
+    def __init__(self, *collectors: ElementCollector) -> None:
+        self.collectors: Tuple[ElementCollector, ...] = collectors
+
+    @property
+    def done(self) -> bool:
+        """Whether all collectors are complete"""
+        return all(collector.done for collector in self.collectors)
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        for collector in self.collectors:
+            collector.start(tag, attrib)
+
+    def end(self, tag: str) -> None:
+        for collector in self.collectors:
+            collector.end(tag)
+
+    def close(self) -> Tuple[str, ...]:
+        return tuple(
+            value for collector in self.collectors for value in collector.close()
+        )
+
+
+def pager_links_collector() -> ElementCollector:
+    """Collector of pagination links on a catalog page"""
+    return ElementCollector("pager__link", "href")
+
+
+def wallpaper_links_collector() -> ElementCollector:
+    """Collector of wallpaper page links on a catalog page"""
+    return ElementCollector(
+        "wallpapers__link", "href", container_class="wallpapers__list"
+    )
+
+
+def image_url_collector() -> ElementCollector:
+    """Collector of the direct image URL on a wallpaper page"""
+    return ElementCollector("wallpaper__image", "src", limit=1)
+
+
+def extract_values(
+    content: str, collector: Union[ElementCollector, CollectorGroup]
+) -> Tuple[str, ...]:
+    """Run HTML through the collector and return the collected values"""
+    parser = etree.HTMLParser(target=collector)
+    try:
+        parser.feed(content)
+        parser.close()
+    except etree.LxmlError as e:
+        logger.warning(f"Failed to parse HTML: {e}")
+    return collector.close()
+
+
+def extract_wallpaper_links(content: str) -> Tuple[str, ...]:
+    """Extract wallpaper page links from catalog page HTML"""
+    return extract_values(content, wallpaper_links_collector())
+
+
+def extract_image_url(content: str) -> Optional[str]:
+    """Extract direct image URL from wallpaper page HTML"""
+    values = extract_values(content, image_url_collector())
+    return values[0] if values else None
+
+
+@dataclass
+class ImageStream:
+    """Image body being received: chunks start at ``offset`` of ``total`` bytes"""
+
+    offset: int
+    total: Optional[int]
+    chunks: AsyncIterator[bytes]
+
+
+@dataclass
+class ParserStats:
+    """Counters of random wallpaper picks"""
+
+    rotations: int = 0
+    failures: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    request_rate: float = 0.0
+    concurrency: float = 0.0
+    throttled: int = 0
+    connections_closed: int = 0
+
+    @property
+    def failure_rate(self) -> float:
+        """Share of picks that failed"""
+        return self.failures / self.rotations if self.rotations else 0.0
+
+    def record(self, success: bool) -> None:
+        """Count a finished pick"""
+        self.rotations += 1
+        if not success:
+            self.failures += 1
+
+    def __str__(self) -> str:
+        return (
+            f"rotations={self.rotations}, failures={self.failures}, "
+            f"failure_rate={self.failure_rate:.1%}, "
+            f"hedges={self.hedges}, hedge_wins={self.hedge_wins}, "
+            f"request_rate={self.request_rate:.1f}/s, "
+            f"concurrency={self.concurrency:.1f}, throttled={self.throttled}, "
+            f"connections_closed={self.connections_closed}"
+        )
 
 
 class AbstractImageParser(ABC):
@@ -26,16 +229,68 @@ class AbstractImageParser(ABC):
         """Get random image URL from the source"""
         pass
 
-    @abstractmethod
-    async def download_image(self, url: str, session: ClientSession) -> bytes:
-        """Download image from the given URL"""
-        pass
-
 
 class WallpapersCraftParser(AbstractImageParser):
-    def __init__(self, config: Config) -> None:
+    def __init__(
+        self,
+        config: Config,
+        http_client: HttpClient,
+        catalog_cache: Optional[CatalogCache] = None,
+        image_url_index: Optional[ImageUrlIndex] = None,
+        page_count_cache: Optional[PageCountCache] = None,
+        sampler: Optional[CatalogSampler] = None,
+        resilience: Optional[ResilientCaller] = None,
+    ) -> None:
         self.config: Config = config
+        self.http_client: HttpClient = http_client
+        self.catalog_cache: CatalogCache = catalog_cache or CatalogCache(
+            config.CACHE_DIR, config.CATALOG_CACHE_TTL
+        )
+        self.image_url_index: ImageUrlIndex = image_url_index or ImageUrlIndex(
+            config.CACHE_DIR / "image_urls.jsonl", config.FSYNC_MODE
+        )
+        self.page_count_cache: PageCountCache = page_count_cache or PageCountCache(
+            config.CACHE_DIR / "page_counts.json", config.PAGE_COUNT_REFRESH_INTERVAL
+        )
+        self.sampler: CatalogSampler = sampler or CatalogSampler(
+            config.CACHE_DIR / "sampler.json"
+        )
+        self.resilience: ResilientCaller = resilience or ResilientCaller(
+            RetryPolicy(
+                config.RETRY_ATTEMPTS, config.RETRY_BASE_DELAY, config.RETRY_MAX_DELAY
+            ),
+            CircuitBreaker(
+                config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_TIMEOUT
+            ),
+            config.REQUEST_TIMEOUT,
+            RateLimiter(
+                TokenBucket(
+                    config.RATE_LIMIT,
+                    config.RATE_LIMIT_BURST,
+                    config.RATE_LIMIT_MIN,
+                    config.RATE_LIMIT_MAX,
+                ),
+                AimdLimiter(
+                    config.CONCURRENCY_INITIAL,
+                    config.CONCURRENCY_MIN,
+                    config.CONCURRENCY_MAX,
+                    config.CONCURRENCY_DECREASE_FACTOR,
+                ),
+                config.RATE_LIMIT_STEP,
+                config.RETRY_AFTER_MAX,
+            ),
+        )
+        if resilience is None and config.HEDGE_REQUESTS:
+            self.resilience.enable_hedging(
+                LatencyTracker(config.HEDGE_LATENCY_WINDOW, config.HEDGE_MIN_SAMPLES),
+                HedgeBudget(config.HEDGE_MAX_EXTRA_LOAD),
+                config.HEDGE_QUANTILE,
+                config.HEDGE_MIN_DELAY,
+            )
+        self.stats: ParserStats = ParserStats()
         self._catalog_path: Optional[str] = None
+        self._background_tasks: Set["asyncio.Task[None]"] = set()
+        self._page_count_tasks: Dict[str, "asyncio.Task[int]"] = {}
 
     @property
     def catalog_path(self) -> str:
@@ -49,70 +304,453 @@ class WallpapersCraftParser(AbstractImageParser):
         """Set new catalog path"""
         self._catalog_path = value
 
-    async def get_page_content(self, url: str, session: ClientSession) -> str:
-        """Fetch and return page content"""
+    @property
+    def resolution(self) -> str:
+        """Resolution part of the current catalog path"""
+        return self.catalog_path.rstrip("/").rsplit("/", 1)[-1]
+
+    @property
+    def category(self) -> str:
+        """Category part of the current catalog path"""
+        return self.catalog_path.rstrip("/").rsplit("/", 2)[-2]
+
+    @staticmethod
+    def _check_status(response: ClientResponse, *expected: int) -> None:
+        """Raise for an unexpected HTTP status; 429 and 5xx mean throttling"""
+        if response.status in expected:
+            return
+        logger.error(f"Failed to fetch page: HTTP {response.status}")
+        if response.status == 429 or response.status >= 500:
+            raise ThrottledError(
+                f"Page fetch error: HTTP {response.status}",
+                response.status,
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+        raise ParsingError(f"Page fetch error: HTTP {response.status}")
+
+    async def read_values(
+        self,
+        response: ClientResponse,
+        collector: Union[ElementCollector, CollectorGroup],
+    ) -> Tuple[str, ...]:
+        """
+        Feed response body into the collector.
+
+        In streaming mode chunks are parsed as they arrive and reading stops
+        as soon as the collector is done, without waiting for the whole page.
+        """
+        if not self.config.PARSER_STREAMING:
+            return extract_values(await response.text(), collector)
+
+        parser = etree.HTMLParser(
+            target=collector, encoding=response.charset or "utf-8"
+        )
+        received = 0
+        try:
+            async for chunk in response.content.iter_chunked(
+                self.config.STREAM_CHUNK_SIZE
+            ):
+                received += len(chunk)
+                parser.feed(chunk)
+                if collector.done:
+                    break
+            else:
+                parser.close()
+        except etree.LxmlError as e:
+            logger.warning(f"Failed to parse HTML: {e}")
+
+        if collector.done:
+            await self._finish_early(response, received)
+        return collector.close()
+
+    async def _finish_early(self, response: ClientResponse, received: int) -> None:
+        """
+        Release connection of a partially read response.
+
+        A tail of at most STREAM_DRAIN_LIMIT bytes is drained so the
+        connection goes back to the keep-alive pool. A longer tail is never
+        downloaded: the connection is closed instead. Compressed and chunked
+        bodies have no known tail size, so at most STREAM_DRAIN_LIMIT bytes
+        of them are read before closing.
+        """
+        if response.content_length and "Content-Encoding" not in response.headers:
+            if response.content_length - received > self.config.STREAM_DRAIN_LIMIT:
+                self._close_early(response)
+                return
+
+        drained = 0
+        async for chunk in response.content.iter_chunked(self.config.STREAM_CHUNK_SIZE):
+            drained += len(chunk)
+            if drained > self.config.STREAM_DRAIN_LIMIT:
+                self._close_early(response)
+                return
+        response.release()
+
+    def _close_early(self, response: ClientResponse) -> None:
+        """Drop the connection instead of reading the rest of the body"""
+        self.stats.connections_closed += 1
+        response.close()
+
+    async def get_catalog_links(
+        self, page: int, revalidate: bool = False
+    ) -> Tuple[str, ...]:
+        """
+        Get wallpaper page links of a catalog page, using the cache if possible.
+
+        With ``revalidate`` a fresh cached page is still checked with a
+        conditional request, so new wallpapers are seen right away.
+        """
+        cached = self.catalog_cache.get(self.catalog_path, page)
+        if (
+            cached is not None
+            and not revalidate
+            and cached.is_fresh(self.catalog_cache.ttl)
+        ):
+            return cached.hrefs
+
+        catalog_url = f"{self.config.BASE_URL}{self.catalog_path}/page{page}"
+        headers = cached.validators() if cached is not None else {}
+
+        async def fetch() -> CatalogPage:
+            try:
+                async with self.http_client.session.get(
+                    catalog_url, headers=headers
+                ) as response:
+                    if response.status == 304 and cached is not None:
+                        return cached.revalidated()
+                    self._check_status(response, 200)
+                    hrefs = await self.read_values(
+                        response, wallpaper_links_collector()
+                    )
+                    return CatalogPage(
+                        hrefs=hrefs,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+            except ParsingError:
+                raise
+            except Exception as e:
+                logger.error(f"Network error while fetching {catalog_url}: {str(e)}")
+                raise TransientError(f"Network error: {str(e)}")
+
+        entry = await self.resilience.call(fetch, hedge=True)
+
+        if not entry.hrefs:
+            logger.error("No wallpaper links found on page")
+            raise ParsingError("No wallpaper links found")
+
+        await self.catalog_cache.put(self.catalog_path, page, entry)
+        return entry.hrefs
+
+    async def get_image_url(self, wallpaper_path: str) -> str:
+        """Get direct image URL of the wallpaper, using the index if possible"""
+        resolution = self.resolution
+        image_url = self.image_url_index.get(wallpaper_path, resolution)
+        if image_url:
+            return image_url
+
+        image_url = await self.fetch_image_url(wallpaper_path)
+        await self.image_url_index.put(wallpaper_path, resolution, image_url)
+        return image_url
+
+    async def fetch_image_url(self, wallpaper_path: str) -> str:
+        """Fetch direct image URL from the wallpaper page"""
+        full_page_url = f"{self.config.BASE_URL}{wallpaper_path}"
+
+        async def fetch() -> Tuple[str, ...]:
+            try:
+                async with self.http_client.session.get(full_page_url) as response:
+                    self._check_status(response, 200)
+
+                    # Extract direct image URL
+                    return await self.read_values(response, image_url_collector())
+            except ParsingError:
+                raise
+            except Exception as e:
+                logger.error(f"Network error while fetching {full_page_url}: {str(e)}")
+                raise TransientError(f"Network error: {str(e)}")
+
+        values = await self.resilience.call(fetch, hedge=True)
+
+        if not values:
+            logger.error("Image element not found")
+            raise ParsingError("Failed to locate image element")
+
+        return values[0]
+
+    async def get_page_count(self) -> int:
+        """
+        Get number of pages in the current catalog, discovering it if needed.
+
+        Concurrent callers share one discovery per catalog. It is shielded, so
+        a cancelled caller does not abort it for the others.
+        """
+        catalog_path = self.catalog_path
+        pages = self.page_count_cache.get(catalog_path)
+        if pages is not None and self.page_count_cache.is_fresh(catalog_path):
+            return pages
+
+        task = self._page_count_tasks.get(catalog_path)
+        if task is None:
+            task = asyncio.create_task(self._refresh_page_count(catalog_path))
+            self._page_count_tasks[catalog_path] = task
+            task.add_done_callback(
+                lambda _: self._page_count_tasks.pop(catalog_path, None)
+            )
         try:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch page: HTTP {response.status}")
-                    raise ParsingError(f"Page fetch error: HTTP {response.status}")
-                return await response.text()
-        except Exception as e:
-            logger.error(f"Network error while fetching {url}: {str(e)}")
-            raise ParsingError(f"Network error: {str(e)}")
+            return await asyncio.shield(task)
+        except ParsingError as e:
+            logger.warning(f"Failed to discover page count: {e}")
+            return pages or self.config.MAX_PAGES
+
+    async def _refresh_page_count(self, catalog_path: str) -> int:
+        """Discover page count of the catalog and cache it"""
+        pages = await self.discover_page_count()
+        logger.info(f"Catalog {catalog_path} has {pages} pages")
+        await self.page_count_cache.put(catalog_path, pages)
+        return pages
+
+    async def discover_page_count(self) -> int:
+        """
+        Find the last catalog page from pagination or by binary search.
+
+        Wallpaper links of the first page are collected from the same
+        response and cached, so the page is not fetched again for its size.
+        """
+        catalog_path = self.catalog_path
+        first_page_url = f"{self.config.BASE_URL}{catalog_path}/page1"
+
+        async def fetch() -> Tuple[CatalogPage, Tuple[str, ...]]:
+            try:
+                async with self.http_client.session.get(first_page_url) as response:
+                    self._check_status(response, 200)
+                    wallpapers = wallpaper_links_collector()
+                    pager = pager_links_collector()
+                    await self.read_values(response, CollectorGroup(wallpapers, pager))
+                    page = CatalogPage(
+                        hrefs=wallpapers.close(),
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                    return page, pager.close()
+            except ParsingError:
+                raise
+            except Exception as e:
+                raise TransientError(f"Network error: {str(e)}")
+
+        first_page, pager_links = await self.resilience.call(fetch, hedge=True)
+        if not first_page.hrefs:
+            raise ParsingError("Catalog has no wallpapers")
+        await self.catalog_cache.put(catalog_path, 1, first_page)
+
+        page_numbers = [
+            int(match.group(1))
+            for match in map(PAGE_NUMBER_PATTERN.search, pager_links)
+            if match
+        ]
+        if page_numbers:
+            return max(page_numbers)
+
+        # Разметка пагинации не найдена, ищем последнюю страницу
+        return await self._search_last_page()
+
+    async def _page_exists(self, page: int) -> bool:
+        """
+        Whether the catalog page exists and has wallpapers.
+
+        Only a missing or empty page counts as absent; network errors,
+        throttling and an open circuit abort the search instead of
+        shortening the catalog.
+        """
+        try:
+            await self.get_catalog_links(page)
+            return True
+        except (TransientError, CircuitOpenError):
+            raise
+        except ParsingError:
+            return False
+
+    async def _search_last_page(self) -> int:
+        """Binary search for the last catalog page with wallpapers"""
+        low, high = 1, self.config.MAX_PAGE_LIMIT
+        while low < high:
+            middle = (low + high + 1) // 2
+            if await self._page_exists(middle):
+                low = middle
+            else:
+                high = middle - 1
+        return low
 
     async def get_random_image_url(self) -> str:
         """Get random wallpaper URL through multi-step parsing"""
-        random_page = random.randint(1, self.config.MAX_PAGES)
-        catalog_url = f"{self.config.BASE_URL}{self.catalog_path}/page{random_page}"
+        try:
+            image_url = await asyncio.wait_for(
+                self._pick_random_image_url(), self.config.ROTATION_DEADLINE
+            )
+        except asyncio.TimeoutError:
+            self.stats.record(success=False)
+            raise TransientError("Rotation deadline exceeded")
+        except ParsingError:
+            self.stats.record(success=False)
+            raise
+        finally:
+            self.update_stats()
+        self.stats.record(success=True)
+        return image_url
 
-        async with aiohttp.ClientSession() as session:
-            # Fetch preview page
-            preview_content = await self.get_page_content(catalog_url, session)
-            preview_soup = BeautifulSoup(preview_content, "lxml")
+    def update_stats(self) -> None:
+        """Copy request metrics into parser stats"""
+        self.stats.hedges = self.resilience.hedges_sent
+        self.stats.hedge_wins = self.resilience.hedges_won
+        limiter = self.resilience.limiter
+        if limiter is not None:
+            self.stats.request_rate = limiter.bucket.rate
+            self.stats.concurrency = limiter.concurrency.limit
+            self.stats.throttled = limiter.throttled
 
-            # Find and select random wallpaper
-            wallpaper_links = preview_soup.find_all(class_="wallpapers__link")
-            if not wallpaper_links:
-                logger.error("No wallpaper links found on page")
-                raise ParsingError("No wallpaper links found")
+    async def get_page_size(self) -> int:
+        """Number of wallpapers on a full catalog page"""
+        return len(await self.get_catalog_links(1))
 
-            selected_wallpaper = random.choice(wallpaper_links)
-            if not isinstance(selected_wallpaper, Tag):
-                raise ParsingError("Invalid wallpaper element type")
+    async def get_catalog_size(self, pages: int, page_size: int) -> int:
+        """
+        Number of wallpapers in the current catalog.
 
-            wallpaper_path = selected_wallpaper.get("href")
-            if not wallpaper_path:
-                raise ParsingError("Failed to get wallpaper page URL")
+        Counts the links of the last page, so the sampler sees every new
+        wallpaper rather than only new pages. Falls back to full pages if
+        the last page is gone.
+        """
+        try:
+            last_page = await self.get_catalog_links(pages)
+        except (TransientError, CircuitOpenError):
+            raise
+        except ParsingError:
+            return pages * page_size
+        return (pages - 1) * page_size + len(last_page)
 
-            # Fetch full image page
-            full_page_url = f"{self.config.BASE_URL}{wallpaper_path}"
-            full_page_content = await self.get_page_content(full_page_url, session)
+    async def _pick_random_image_url(self) -> str:
+        """Pick wallpaper uniformly without repeats, then resolve its image URL"""
+        pages = await self.get_page_count()
+        page_size = await self.get_page_size()
+        total = await self.get_catalog_size(pages, page_size)
 
-            # Extract direct image URL
-            full_page_soup = BeautifulSoup(full_page_content, "lxml")
-            image_element = full_page_soup.find(class_="wallpaper__image")
+        # Страницы из кэша могут немного расходиться, позиции за пределами
+        # страницы пропускаются, поэтому выбор равномерен по реальным обоям
+        for _ in range(page_size * 2):
+            position = self.sampler.next_position(self.catalog_path, total)
+            page_index, link_index = divmod(position, page_size)
+            wallpaper_links = await self.get_catalog_links(page_index + 1)
+            if link_index < len(wallpaper_links):
+                break
+        else:
+            raise ParsingError("No wallpaper found at sampled positions")
 
-            if not image_element or not isinstance(image_element, Tag):
-                logger.error("Image element not found")
-                raise ParsingError("Failed to locate image element")
+        await self.sampler.save()
+        wallpaper_path = wallpaper_links[link_index]
 
-            image_url = image_element.get("src")
-            if not image_url or not isinstance(image_url, str):
-                logger.error("Invalid image URL")
-                raise ParsingError("Failed to extract image URL")
+        if self.config.IMAGE_URL_INDEX_WARMUP:
+            self.warm_image_url_index(wallpaper_links)
 
-            return image_url
+        # Fetch full image page
+        return await self.get_image_url(wallpaper_path)
+
+    def warm_image_url_index(self, wallpaper_paths: Iterable[str]) -> None:
+        """Resolve image URLs of unknown wallpapers in the background"""
+        resolution = self.resolution
+        missing = [
+            path
+            for path in wallpaper_paths
+            if (path, resolution) not in self.image_url_index
+        ]
+        if missing:
+            task = asyncio.create_task(self._warm_image_urls(missing, resolution))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _warm_image_urls(
+        self, wallpaper_paths: list[str], resolution: str
+    ) -> None:
+        """Fill image URL index with bounded concurrency"""
+        semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_DOWNLOADS)
+
+        async def resolve(path: str) -> None:
+            async with semaphore:
+                if (path, resolution) in self.image_url_index:
+                    return
+                try:
+                    image_url = await self.fetch_image_url(path)
+                except ParsingError as e:
+                    logger.warning(f"Failed to index {path}: {e}")
+                    return
+                await self.image_url_index.put(path, resolution, image_url)
+
+        await asyncio.gather(*(resolve(path) for path in wallpaper_paths))
 
-    async def download_image(self, url: str, session: ClientSession) -> bytes:
-        """Загрузка изображения"""
+    def cancel_background_tasks(self) -> None:
+        """Cancel background index warm-up and page count discovery"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        for page_count_task in list(self._page_count_tasks.values()):
+            page_count_task.cancel()
+
+    @asynccontextmanager
+    async def open_image_stream(
+        self, url: str, offset: int = 0
+    ) -> AsyncIterator[ImageStream]:
+        """
+        Открыть поток загрузки изображения.
+
+        При ненулевом смещении запрашивается продолжение через HTTP Range.
+        Если сервер не поддерживает Range, поток начинается с нулевого смещения.
+        """
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        self.resilience.check()
         try:
-            async with session.get(url) as response:
-                if response.status != 200:
+            async with self.resilience.slot(), self.http_client.session.get(
+                url, headers=headers
+            ) as response:
+                if response.status == 206:
+                    match = CONTENT_RANGE_PATTERN.match(
+                        response.headers.get("Content-Range", "")
+                    )
+                    if not match:
+                        raise ParsingError("Некорректный заголовок Content-Range")
+                    start = int(match.group(1))
+                    total = None if match.group(2) == "*" else int(match.group(2))
+                elif response.status == 200:
+                    start = 0
+                    total = (
+                        None
+                        if "Content-Encoding" in response.headers
+                        else response.content_length
+                    )
+                elif response.status == 429 or response.status >= 500:
+                    raise ThrottledError(
+                        f"Ошибка загрузки изображения: {response.status}",
+                        response.status,
+                        parse_retry_after(response.headers.get("Retry-After")),
+                    )
+                else:
                     raise ParsingError(
                         f"Ошибка загрузки изображения: {response.status}"
                     )
-                return await response.read()
-        except Exception as e:
+
+                self.resilience.breaker.record_success()
+                yield ImageStream(
+                    offset=start,
+                    total=total,
+                    chunks=response.content.iter_chunked(
+                        self.config.DOWNLOAD_CHUNK_SIZE
+                    ),
+                )
+        except TransientError as e:
+            self.resilience.record_error(e)
+            raise
+        except (ClientError, asyncio.TimeoutError) as e:
             logger.error(f"Ошибка при загрузке изображения {url}: {e}")
-            raise ParsingError(f"Ошибка загрузки: {e}")
+            error = TransientError(f"Ошибка загрузки: {e}")
+            self.resilience.record_error(error)
+            raise error
+        except asyncio.CancelledError:
+            self.resilience.breaker.release_trial()
+            raise
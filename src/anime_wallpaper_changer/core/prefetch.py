@@ -0,0 +1,298 @@
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Optional, Set, Tuple
+import asyncio
+
+from PIL import Image
+
+from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.dedup import PerceptualIndex, dhash
+from anime_wallpaper_changer.core.errors import (
+    CircuitOpenError,
+    ParsingError,
+    TransientError,
+)
+from anime_wallpaper_changer.core.parser import WallpapersCraftParser
+from anime_wallpaper_changer.core.saver import PARTIAL_SUFFIX, ImageSaver
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+@dataclass(frozen=True)
+class PrefetchedWallpaper:
+    """Wallpaper downloaded ahead of time and waiting in the staging folder"""
+
+    path: Path
+    size: int
+    url: Optional[str] = None
+
+
+def validate_image(image_path: Path) -> bool:
+    """Check that downloaded file is a complete, decodable image"""
+    try:
+        with Image.open(image_path) as img:
+            img.verify()
+        return True
+    except Exception as e:
+        logger.warning(f"Загруженный файл не является изображением: {e}")
+        return False
+
+
+class PrefetchQueue:
+    """
+    Bounded queue of wallpapers downloaded in the background.
+
+    Keeps up to Config.PREFETCH_DEPTH validated wallpapers of the current
+    catalog (category and resolution) in a staging folder, so the next
+    wallpaper is served from local disk instead of three sequential HTTP
+    requests. Staged files survive restarts and are picked up again for the
+    same catalog. Wallpapers that look like one of the recently saved ones
+    are dropped and another one is picked.
+    """
+
+    def __init__(
+        self,
+        parser: WallpapersCraftParser,
+        saver: ImageSaver,
+        config: Config,
+        perceptual_index: Optional[PerceptualIndex] = None,
+    ) -> None:
+        self.parser: WallpapersCraftParser = parser
+        self.saver: ImageSaver = saver
+        self.config: Config = config
+        self._perceptual_index: Optional[PerceptualIndex] = perceptual_index
+        self._staging_root: Path = config.CACHE_DIR / "prefetch"
+        self._staging: Optional[ImageSaver] = None
+        self._catalog_path: Optional[str] = None
+        self._ready: Deque[PrefetchedWallpaper] = deque()
+        self._workers: Set["asyncio.Task[None]"] = set()
+        self._downloads: Set["asyncio.Task[Tuple[Path, str]]"] = set()
+        self._idle: asyncio.Event = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def perceptual_index(self) -> Optional[PerceptualIndex]:
+        """Perceptual hashes kept in the library of the current saver"""
+        index = self._perceptual_index
+        if self.config.DEDUP_ENABLED and (
+            index is None or index.library is not self.saver.library
+        ):
+            index = self._perceptual_index = PerceptualIndex(
+                self.saver.library,
+                self.config.DEDUP_MAX_DISTANCE,
+                self.config.DEDUP_RECENT_WINDOW,
+            )
+        return index
+
+    @property
+    def staged_bytes(self) -> int:
+        """Disk space taken by wallpapers waiting in the queue"""
+        return sum(item.size for item in self._ready)
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def set_catalog(self, catalog_path: str) -> None:
+        """Switch queue to another catalog, invalidating staged wallpapers"""
+        if catalog_path == self._catalog_path:
+            self._refill()
+            return
+
+        if self._catalog_path is not None:
+            self.invalidate()
+
+        self._catalog_path = catalog_path
+        self.parser.catalog_path = catalog_path
+        self._staging = ImageSaver(
+            self._staging_root.joinpath(*catalog_path.strip("/").split("/")),
+            fsync=self.config.FSYNC_MODE,
+        )
+        self._load_staged()
+        self._refill()
+
+    def _load_staged(self) -> None:
+        """Pick up wallpapers staged by a previous run"""
+        if self._staging is None:
+            return
+        staged = [
+            path
+            for path in self._staging.output_dir.iterdir()
+            if path.is_file()
+            and path.suffix != PARTIAL_SUFFIX
+            and not path.name.startswith(".")
+        ]
+        for path in sorted(staged, key=lambda path: path.stat().st_mtime):
+            size = path.stat().st_size
+            if size and len(self._ready) < self.config.PREFETCH_DEPTH:
+                self._ready.append(PrefetchedWallpaper(path, size))
+            else:
+                path.unlink(missing_ok=True)
+        if self._ready:
+            logger.info(f"Найдено подготовленных обоев: {len(self._ready)}")
+
+    def stop(self) -> None:
+        """Cancel background downloads, keeping staged wallpapers on disk"""
+        for task in list(self._workers) + list(self._downloads):
+            task.cancel()
+        self._workers.clear()
+        self._downloads.clear()
+        self._idle.set()
+
+    def invalidate(self) -> None:
+        """Drop staged wallpapers and cancel background downloads"""
+        self.stop()
+        while self._ready:
+            self._ready.popleft().path.unlink(missing_ok=True)
+
+    def _refill(self) -> None:
+        """Start background downloads until the queue is full"""
+        while (
+            self._staging is not None
+            and len(self._ready) + len(self._workers) < self.config.PREFETCH_DEPTH
+            and len(self._workers) < self.config.PREFETCH_CONCURRENCY
+            and self.staged_bytes < self.config.PREFETCH_DISK_BUDGET
+        ):
+            task = asyncio.create_task(self._prefetch_one(self._staging))
+            self._workers.add(task)
+            self._idle.clear()
+
+    async def _prefetch_one(self, staging: ImageSaver) -> None:
+        """Download one wallpaper into the staging folder"""
+        task = asyncio.current_task()
+        succeeded = False
+        try:
+            path, image_url = await self._fetch(staging)
+            if staging is not self._staging:
+                path.unlink(missing_ok=True)
+                return
+            if all(item.path != path for item in self._ready):
+                self._ready.append(
+                    PrefetchedWallpaper(path, path.stat().st_size, image_url)
+                )
+                logger.info(f"Обои подготовлены заранее: {path.name}")
+            succeeded = True
+        except (ParsingError, OSError) as e:
+            # Повторная попытка будет при следующем запросе обоев
+            logger.warning(f"Не удалось подготовить обои заранее: {e}")
+        finally:
+            if task is not None:
+                self._workers.discard(task)
+            if succeeded:
+                self._refill()
+            if not self._workers:
+                self._idle.set()
+
+    async def _fetch(self, saver: ImageSaver) -> Tuple[Path, str]:
+        """Download, validate and save one random wallpaper with its URL"""
+        for _ in range(self.config.DEDUP_MAX_REJECTS + 1):
+            image_url = await self.parser.get_random_image_url()
+            image_path = await saver.save_stream(
+                lambda offset: self.parser.open_image_stream(image_url, offset),
+                image_url.split("/")[-1],
+                attempts=self.config.DOWNLOAD_ATTEMPTS,
+                retry_policy=self.parser.resilience.retry_policy,
+                url=image_url,
+                validate=validate_image,
+                category=self.parser.category,
+                resolution=self.parser.resolution,
+            )
+            if image_path is None:
+                raise ParsingError("Не удалось сохранить изображение")
+            if await self._is_new_look(image_path):
+                return image_path, image_url
+            await saver.discard(image_path)
+
+        raise ParsingError("Найдены только похожие на недавние обои")
+
+    async def _is_new_look(self, image_path: Path) -> bool:
+        """Index wallpaper, False if it looks like a recently saved one"""
+        perceptual_index = self.perceptual_index
+        if perceptual_index is None:
+            return True
+        try:
+            image_hash = await asyncio.to_thread(dhash, image_path)
+        except OSError as e:
+            logger.warning(f"Не удалось вычислить хеш изображения: {e}")
+            return True
+
+        duplicate = perceptual_index.find_recent(image_hash)
+        if duplicate is not None and duplicate != image_path.name:
+            logger.info(f"Обои {image_path.name} похожи на {duplicate}, пропускаем")
+            return False
+        perceptual_index.add(image_path.name, image_hash)
+        return True
+
+    async def get(self) -> Path:
+        """
+        Get next wallpaper saved in the output folder.
+
+        Served from the queue when possible, otherwise downloaded right away.
+        If the site is unavailable or the download misses
+        Config.OFFLINE_ROTATION_DEADLINE, a previously saved wallpaper is
+        returned and the download finishes in the background. The queue is
+        refilled in the background in all cases.
+        """
+        if self._catalog_path is None:
+            self.set_catalog(self.parser.catalog_path)
+
+        try:
+            while self._ready:
+                item = self._ready.popleft()
+                try:
+                    target = await self.saver.import_file(
+                        item.path,
+                        item.path.name,
+                        url=item.url,
+                        category=self.parser.category,
+                        resolution=self.parser.resolution,
+                    )
+                except OSError as e:
+                    logger.warning(f"Не удалось взять обои из очереди: {e}")
+                    continue
+                logger.info(f"Обои выданы из очереди: {target}")
+                return target
+
+            fetch = asyncio.create_task(self._fetch(self.saver))
+            done, _ = await asyncio.wait(
+                {fetch}, timeout=self.config.OFFLINE_ROTATION_DEADLINE
+            )
+            if not done:
+                fallback = self._pick_local()
+                if fallback is not None:
+                    logger.warning(
+                        "Сайт отвечает слишком долго, выбраны локальные обои"
+                    )
+                    # Загрузка продолжится в фоне и пополнит библиотеку
+                    self._downloads.add(fetch)
+                    fetch.add_done_callback(self._download_done)
+                    return fallback
+
+            try:
+                image_path, _ = await fetch
+                return image_path
+            except (TransientError, CircuitOpenError) as e:
+                fallback = self._pick_local()
+                if fallback is None:
+                    raise
+                logger.warning(f"Сайт недоступен ({e}), выбраны локальные обои")
+                return fallback
+        finally:
+            self._refill()
+
+    def _pick_local(self) -> Optional[Path]:
+        """Previously saved wallpaper of the current catalog"""
+        return self.saver.pick_local(self.parser.category, self.parser.resolution)
+
+    def _download_done(self, task: "asyncio.Task[Tuple[Path, str]]") -> None:
+        """Forget a download that outlived the deadline"""
+        self._downloads.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Фоновая загрузка обоев не удалась: {task.exception()}")
+
+    async def wait_filled(self) -> None:
+        """Wait until background downloads are finished"""
+        await self._idle.wait()
+        if self._downloads:
+            await asyncio.wait(set(self._downloads))
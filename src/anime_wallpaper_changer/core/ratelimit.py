@@ -0,0 +1,256 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncContextManager, AsyncIterator, Optional
+import asyncio
+import time
+
+from anime_wallpaper_changer.core.errors import (
+    ParsingError,
+    ThrottledError,
+    TransientError,
+)
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Request rate limiter with an adjustable rate.
+
+    Tokens are added at ``rate`` per second up to ``burst``; every request
+    takes one. Waiters are served in arrival order.
+    """
+
+    def __init__(
+        self, rate: float, burst: float, min_rate: float, max_rate: float
+    ) -> None:
+        self.rate: float = rate
+        self.burst: float = burst
+        self.min_rate: float = min_rate
+        self.max_rate: float = max_rate
+        self._tokens: float = burst
+        self._updated: float = time.monotonic()
+        self._paused_until: float = 0.0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now <= self._updated:
+            return
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait for a token"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def try_acquire(self) -> bool:
+        """Take a token without waiting, False if none is free"""
+        now = time.monotonic()
+        if self._lock.locked() or now < self._paused_until:
+            # Ожидающие запросы обслуживаются первыми
+            return False
+        self._refill(now)
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the given time"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = max(now, self._paused_until)
+
+    def slow_down(self, factor: float) -> None:
+        """Multiply the rate by factor, not going below the minimum"""
+        self._refill(time.monotonic())
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def speed_up(self, step: float) -> None:
+        """Increase the rate by step, not going above the maximum"""
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, self.rate + step)
+
+
+class AimdLimiter:
+    """
+    Concurrency limit with additive increase, multiplicative decrease.
+
+    Every successful request raises the limit by ``1 / limit``, so it grows
+    by about one per round of requests; a throttled request multiplies it by
+    ``decrease_factor``. Throttles from requests that started before the last
+    decrease are ignored, so one overload burst shrinks the limit only once.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, decrease_factor: float
+    ) -> None:
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.decrease_factor: float = decrease_factor
+        self.limit: float = float(initial)
+        self.in_flight: int = 0
+        self._last_decrease: float = 0.0
+        self._condition: asyncio.Condition = asyncio.Condition()
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new requests would have to wait"""
+        return self.in_flight >= int(self.limit)
+
+    async def acquire(self) -> None:
+        """Wait for a free slot"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self.saturated)
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """Take a slot without waiting, False if the limit is reached"""
+        if self.saturated:
+            return False
+        self.in_flight += 1
+        return True
+
+    async def release(self) -> None:
+        """Free a slot"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        """Additive increase"""
+        self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, started_at: float) -> bool:
+        """Multiplicative decrease, False if the throttle was already handled"""
+        if started_at < self._last_decrease:
+            return False
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        self._last_decrease = time.monotonic()
+        return True
+
+
+class RateLimiter:
+    """
+    Adaptive limiter under all requests to the site.
+
+    Combines a token bucket for the request rate with an AIMD concurrency
+    limit. Both grow while requests succeed and shrink when the site
+    answers 429 or 5xx; a Retry-After header pauses all requests.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        concurrency: AimdLimiter,
+        rate_step: float,
+        max_pause: float,
+    ) -> None:
+        self.bucket: TokenBucket = bucket
+        self.concurrency: AimdLimiter = concurrency
+        self.rate_step: float = rate_step
+        self.max_pause: float = max_pause
+        self.throttled: int = 0
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the concurrency limit is reached"""
+        return self.concurrency.saturated
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a request slot, adapting limits to the outcome of the request"""
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            await self.concurrency.release()
+            raise
+        async with self._held():
+            yield
+
+    def try_slot(self) -> Optional[AsyncContextManager[None]]:
+        """
+        Request slot taken without waiting, None if either limit is reached.
+
+        The slot is held from this call; the returned context manager must be
+        entered to release it.
+        """
+        if not self.concurrency.try_acquire():
+            return None
+        if not self.bucket.try_acquire():
+            # Слот взят синхронно, никто не успел его ждать
+            self.concurrency.in_flight -= 1
+            return None
+        return self._held()
+
+    @asynccontextmanager
+    async def _held(self) -> AsyncIterator[None]:
+        """Run a request in an acquired slot and release it afterwards"""
+        try:
+            started = time.monotonic()
+            try:
+                yield
+            except ThrottledError as e:
+                self._on_throttle(e, started)
+                raise
+            except TransientError:
+                # Сетевые ошибки не говорят о перегрузке сайта
+                raise
+            except ParsingError:
+                self._on_success()
+                raise
+            else:
+                self._on_success()
+        finally:
+            await self.concurrency.release()
+
+    def _on_success(self) -> None:
+        self.concurrency.on_success()
+        self.bucket.speed_up(self.rate_step)
+
+    def _on_throttle(self, error: ThrottledError, started: float) -> None:
+        self.throttled += 1
+        if error.retry_after:
+            self.bucket.pause(min(error.retry_after, self.max_pause))
+        if self.concurrency.on_throttle(started):
+            self.bucket.slow_down(self.concurrency.decrease_factor)
+            logger.warning(
+                f"Site throttled requests (HTTP {error.status}), slowing down: {self}"
+            )
+
+    def __str__(self) -> str:
+        return (
+            f"rate={self.bucket.rate:.1f}/s, "
+            f"concurrency={self.concurrency.limit:.1f}, "
+            f"in_flight={self.concurrency.in_flight}, throttled={self.throttled}"
+        )
@@ -0,0 +1,332 @@
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import (
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Deque,
+    Optional,
+    Set,
+    TypeVar,
+)
+import asyncio
+import math
+import random
+import time
+
+from anime_wallpaper_changer.core.errors import (
+    CircuitOpenError,
+    ThrottledError,
+    TransientError,
+)
+from anime_wallpaper_changer.core.ratelimit import RateLimiter
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    attempts: int
+    base_delay: float
+    max_delay: float
+
+    def delay(self, attempt: int) -> float:
+        """Pause before the retry following attempt number ``attempt`` (from 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a failing site for a while.
+
+    After ``failure_threshold`` consecutive transient failures the circuit
+    opens and requests fail fast. After ``reset_timeout`` seconds a single
+    trial request is let through; its result closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self._failures: int = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight: bool = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are currently rejected"""
+        if self._opened_at is None:
+            return False
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self._trial_in_flight
+        return True
+
+    def allow(self) -> bool:
+        """Check whether a request may be sent now"""
+        if self._opened_at is None:
+            return True
+        if self.is_open:
+            return False
+        # Полуоткрытое состояние: пропускаем один пробный запрос
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        """Register a request that reached the site"""
+        if self._opened_at is not None:
+            logger.info("Сайт снова доступен, запросы возобновлены")
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Forget a trial request that ended without a result"""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Register a transient failure"""
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning(
+                    f"Сайт недоступен, запросы приостановлены на {self.reset_timeout} с"
+                )
+            self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies"""
+
+    def __init__(self, window: int, min_samples: int) -> None:
+        self.min_samples: int = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        """Add latency of a successful request in seconds"""
+        self._samples.append(latency)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """Latency at the given quantile (0..1), None until enough samples"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)
+        return ordered[max(0, index)]
+
+
+class HedgeBudget:
+    """
+    Caps extra load from hedged requests.
+
+    Every request earns ``ratio`` of a token, every hedge spends one, so
+    hedges never exceed that share of traffic over time.
+    """
+
+    def __init__(self, ratio: float, burst: float = 2.0) -> None:
+        self.ratio: float = ratio
+        self.burst: float = burst
+        self._tokens: float = 0.0
+
+    def record_request(self) -> None:
+        """Earn budget for one primary request"""
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    @property
+    def available(self) -> bool:
+        """Whether a hedge can be paid for"""
+        return self._tokens >= 1.0
+
+    def try_acquire(self) -> bool:
+        """Spend budget for one hedge if available"""
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+
+class _HedgeSkipped(Exception):
+    """A hedge found no free request slot or budget when it was due"""
+
+
+class ResilientCaller:
+    """
+    Runs parser requests with a timeout, retries and a circuit breaker.
+
+    Only TransientError and timeouts are retried and counted by the breaker;
+    other errors mean the site answered and are passed through unchanged.
+    With a rate limiter every attempt waits for a request slot first; the
+    wait does not count towards the request timeout.
+    """
+
+    def __init__(
+        self,
+        retry_policy: RetryPolicy,
+        breaker: CircuitBreaker,
+        request_timeout: float,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self.retry_policy: RetryPolicy = retry_policy
+        self.breaker: CircuitBreaker = breaker
+        self.request_timeout: float = request_timeout
+        self.limiter: Optional[RateLimiter] = limiter
+        self.latency: Optional[LatencyTracker] = None
+        self.hedge_budget: Optional[HedgeBudget] = None
+        self.hedge_quantile: float = 0.95
+        self.hedge_min_delay: float = 0.0
+        self.hedges_sent: int = 0
+        self.hedges_won: int = 0
+
+    def enable_hedging(
+        self,
+        latency: LatencyTracker,
+        budget: HedgeBudget,
+        quantile: float,
+        min_delay: float,
+    ) -> None:
+        """
+        Send a duplicate of slow idempotent requests.
+
+        A hedge goes out when a request has not finished within the given
+        latency quantile of recent requests and the budget allows it.
+        """
+        self.latency = latency
+        self.hedge_budget = budget
+        self.hedge_quantile = quantile
+        self.hedge_min_delay = min_delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Time to wait before hedging, None if hedging is not possible"""
+        if self.latency is None:
+            return None
+        if self.limiter is not None and self.limiter.saturated:
+            # Не добавляем нагрузку, когда лимит одновременных запросов исчерпан
+            return None
+        delay = self.latency.percentile(self.hedge_quantile)
+        if delay is None:
+            return None
+        return max(delay, self.hedge_min_delay)
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        """Run one attempt, hedged if allowed, and record its latency"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        if self.hedge_budget is not None:
+            self.hedge_budget.record_request()
+
+        delay = self._hedge_delay() if hedge else None
+        if delay is None:
+            result = await operation()
+        else:
+            result = await self._hedged(operation, delay)
+
+        if self.latency is not None:
+            self.latency.record(loop.time() - started)
+        return result
+
+    async def _hedge(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """
+        Send the duplicate request in a request slot of its own.
+
+        The slot and the budget are checked when the hedge is due, without
+        waiting: a hedge that would exceed the rate or concurrency limit is
+        skipped. Nothing is awaited between taking the slot and entering it.
+        """
+        if self.hedge_budget is None or not self.hedge_budget.available:
+            raise _HedgeSkipped()
+        slot: Optional[AsyncContextManager[None]] = nullcontext()
+        if self.limiter is not None:
+            slot = self.limiter.try_slot()
+        if slot is None:
+            raise _HedgeSkipped()
+        self.hedge_budget.try_acquire()
+        self.hedges_sent += 1
+        async with slot:
+            return await operation()
+
+    async def _hedged(self, operation: Callable[[], Awaitable[T]], delay: float) -> T:
+        """Race the request against a duplicate started after ``delay``"""
+        primary: "asyncio.Future[T]" = asyncio.ensure_future(operation())
+        pending: Set["asyncio.Future[T]"] = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                pending.add(asyncio.ensure_future(self._hedge(operation)))
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    task_error = task.exception()
+                    if task_error is None:
+                        if task is not primary:
+                            self.hedges_won += 1
+                        return task.result()
+                    if not isinstance(task_error, _HedgeSkipped):
+                        error = task_error
+                if not pending:
+                    assert error is not None
+                    raise error
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def check(self) -> None:
+        """Fail fast if the circuit is open"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Site is unavailable, circuit is open")
+
+    def slot(self) -> AsyncContextManager[None]:
+        """Request slot of the rate limiter, if there is one"""
+        if self.limiter is None:
+            return nullcontext()
+        return self.limiter.slot()
+
+    def record_error(self, error: BaseException) -> None:
+        """Count a transient failure; HTTP 429 means the site is up"""
+        if isinstance(error, ThrottledError) and error.status == 429:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    async def call(
+        self, operation: Callable[[], Awaitable[T]], hedge: bool = False
+    ) -> T:
+        """Run operation, retrying transient failures with backoff"""
+        attempts = max(1, self.retry_policy.attempts)
+        for attempt in range(attempts):
+            self.check()
+            try:
+                async with self.slot():
+                    result = await asyncio.wait_for(
+                        self._attempt(operation, hedge), self.request_timeout
+                    )
+            except (TransientError, asyncio.TimeoutError) as e:
+                self.record_error(e)
+                if attempt + 1 >= attempts:
+                    if isinstance(e, TransientError):
+                        raise
+                    raise TransientError(f"Request timed out: {e}") from e
+                delay = self.retry_policy.delay(attempt)
+                logger.warning(f"Transient error: {e!r}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+        raise TransientError("Retry attempts exhausted")
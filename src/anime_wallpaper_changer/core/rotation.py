@@ -0,0 +1,142 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import random
+import time
+
+from anime_wallpaper_changer.core.library import LibraryIndex
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SAMPLE_SIZE = 4
+
+CatalogKey = Tuple[Optional[str], Optional[str]]
+
+
+class _Pool:
+    """Names with O(1) add, remove and random access"""
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str) -> None:
+        if name not in self._positions:
+            self._positions[name] = len(self.names)
+            self.names.append(name)
+
+    def remove(self, name: str) -> None:
+        position = self._positions.pop(name, None)
+        if position is None:
+            return
+        last = self.names.pop()
+        if position < len(self.names):
+            self.names[position] = last
+            self._positions[last] = position
+
+    def sample(self) -> str:
+        return self.names[random.randrange(len(self.names))]
+
+
+class OfflineRotation:
+    """
+    Next wallpaper chosen from the local library without the network.
+
+    Library entries are loaded once into per-catalog pools; after that a
+    pick draws ``sample_size`` random wallpapers of the catalog and returns
+    the one shown least recently (never shown first). This favours old
+    wallpapers the way a least-recently-shown order would, at constant cost
+    per pick regardless of library size.
+    """
+
+    def __init__(
+        self, library: LibraryIndex, output_dir: Path, sample_size: int = SAMPLE_SIZE
+    ) -> None:
+        self.library: LibraryIndex = library
+        self.output_dir: Path = output_dir
+        self.sample_size: int = sample_size
+        self._pools: Optional[Dict[CatalogKey, _Pool]] = None
+        self._everything: _Pool = _Pool()
+        self._catalogs: Dict[str, CatalogKey] = {}
+        self._last_shown: Dict[str, float] = {}
+
+    def _load(self) -> Dict[CatalogKey, _Pool]:
+        """Build pools from the library index once"""
+        if self._pools is not None:
+            return self._pools
+
+        self._pools = {}
+        self._everything = _Pool()
+        self._catalogs.clear()
+        self._last_shown.clear()
+        for entry in self.library.query():
+            self.add(entry.name, entry.category, entry.resolution)
+            if entry.last_shown_at is not None:
+                self._last_shown[entry.name] = entry.last_shown_at
+        return self._pools
+
+    def reset(self) -> None:
+        """Reload pools from the index on next use"""
+        self._pools = None
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._everything)
+
+    def add(
+        self, name: str, category: Optional[str], resolution: Optional[str]
+    ) -> None:
+        """Make a newly indexed wallpaper available"""
+        if self._pools is None:
+            # Пулы еще не построены и будут загружены из индекса целиком
+            return
+        key = (category, resolution)
+        previous = self._catalogs.get(name)
+        if previous is not None and previous != key:
+            self._pools[previous].remove(name)
+        self._pools.setdefault(key, _Pool()).add(name)
+        self._everything.add(name)
+        self._catalogs[name] = key
+
+    def remove(self, name: str) -> None:
+        """Forget a deleted wallpaper"""
+        if self._pools is None:
+            return
+        key = self._catalogs.pop(name, None)
+        if key is not None:
+            self._pools[key].remove(name)
+        self._everything.remove(name)
+        self._last_shown.pop(name, None)
+
+    def mark_shown(self, name: str) -> None:
+        """Move the wallpaper to the end of the rotation"""
+        self._last_shown[name] = time.time()
+
+    def pick(
+        self, category: Optional[str] = None, resolution: Optional[str] = None
+    ) -> Optional[Path]:
+        """
+        Least recently shown of a few random wallpapers of the catalog.
+
+        Falls back to the whole library when the catalog has no wallpapers.
+        The picked wallpaper counts as shown, so repeated picks differ.
+        """
+        pools = self._load()
+        pool = pools.get((category, resolution))
+        if pool is None or not len(pool):
+            pool = self._everything
+            if len(pool):
+                logger.info("В библиотеке нет обоев каталога, выбираем из всех")
+
+        while len(pool):
+            candidates = {pool.sample() for _ in range(self.sample_size)}
+            name = min(candidates, key=lambda name: self._last_shown.get(name, 0.0))
+            image_path = self.output_dir / name
+            if image_path.exists():
+                self.mark_shown(name)
+                return image_path
+            self.remove(name)
+        return None
@@ -0,0 +1,158 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import random
+
+from anime_wallpaper_changer.utils.logger import setup_logger
+from anime_wallpaper_changer.utils.storage import read_json, write_json
+
+logger = setup_logger(__name__)
+
+
+class FeistelPermutation:
+    """
+    Keyed pseudo-random permutation of range(size).
+
+    A balanced Feistel network over the smallest even bit width that covers
+    the range, with cycle walking to stay inside it. The whole permutation is
+    defined by (size, seed), so it never has to be stored.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int) -> None:
+        if size <= 0:
+            raise ValueError("Permutation size must be positive")
+        self.size: int = size
+        self.seed: int = seed
+        self._half_bits: int = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._mask: int = (1 << self._half_bits) - 1
+
+    def _round(self, value: int, round_index: int) -> int:
+        digest = hashlib.blake2b(
+            f"{self.seed}:{round_index}:{value}".encode(), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little") & self._mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._mask
+        for round_index in range(self.ROUNDS):
+            left, right = right, left ^ self._round(right, round_index)
+        return (left << self._half_bits) | right
+
+    def __call__(self, index: int) -> int:
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+@dataclass
+class SamplerState:
+    """
+    Position in the shuffled order of one catalog.
+
+    The permutation covers the ``total`` wallpapers the pass started with.
+    Wallpapers published later appear at the top of the catalog: ``added``
+    of them push the original ones down, and ``added_cursor`` of them have
+    been returned already, oldest first.
+    """
+
+    total: int
+    seed: int
+    cursor: int = 0
+    epoch: int = 0
+    added: int = 0
+    added_cursor: int = 0
+
+    @property
+    def remaining(self) -> int:
+        """Positions not yet returned in this pass"""
+        return self.total - self.cursor + self.added - self.added_cursor
+
+
+class CatalogSampler:
+    """
+    Uniform sampling of catalog positions without replacement.
+
+    Every catalog (category and resolution) gets a seeded permutation of its
+    positions and a cursor into it, persisted as a few integers, so a
+    wallpaper is not picked again until the whole catalog has been shown,
+    even across restarts.
+
+    The catalog lists the newest wallpapers first, so growth is taken as
+    new wallpapers at the top: the permutation is kept, shifted down past
+    them, and the new ones are handed out alongside it. A catalog that
+    shrinks cannot be tracked this way; positions past its end are skipped
+    and the shift may cause a few repeats until the next pass.
+    """
+
+    def __init__(self, state_file: Path) -> None:
+        self.state_file: Path = state_file
+        self._states: Optional[Dict[str, SamplerState]] = None
+
+    def _load(self) -> Dict[str, SamplerState]:
+        """Load sampler states from disk once"""
+        if self._states is None:
+            self._states = {}
+            data = read_json(self.state_file)
+            if isinstance(data, dict):
+                for catalog_path, state in data.items():
+                    try:
+                        self._states[catalog_path] = SamplerState(**state)
+                    except TypeError:
+                        continue
+        return self._states
+
+    def next_position(self, catalog_path: str, total: int) -> int:
+        """
+        Get next position in range(total) for the catalog.
+
+        The order is reshuffled only when all positions have been returned.
+        """
+        if total <= 0:
+            raise ValueError("Catalog size must be positive")
+        states = self._load()
+        state = states.get(catalog_path)
+
+        if state is None:
+            state = SamplerState(total=total, seed=random.getrandbits(63))
+            states[catalog_path] = state
+        elif total > state.total + state.added:
+            state.added = total - state.total
+
+        while True:
+            if state.remaining <= 0:
+                logger.info(f"All wallpapers of {catalog_path} shown, starting over")
+                state.total = total
+                state.seed = random.getrandbits(63)
+                state.cursor = state.added = state.added_cursor = 0
+                state.epoch += 1
+
+            position = self._draw(state)
+            if position < total:
+                return position
+
+    @staticmethod
+    def _draw(state: SamplerState) -> int:
+        """Next position of the pass, choosing new or original wallpapers"""
+        new_left = state.added - state.added_cursor
+        if random.randrange(state.remaining) < new_left:
+            state.added_cursor += 1
+            return new_left - 1
+        position = FeistelPermutation(state.total, state.seed)(state.cursor)
+        state.cursor += 1
+        return position + state.added
+
+    def remaining(self, catalog_path: str) -> Optional[int]:
+        """Number of positions left in the current pass"""
+        state = self._load().get(catalog_path)
+        return state.remaining if state else None
+
+    async def save(self) -> None:
+        """Persist sampler states"""
+        await write_json(
+            self.state_file,
+            {path: asdict(state) for path, state in self._load().items()},
+        )
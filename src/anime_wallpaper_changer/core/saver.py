@@ -1,42 +1,260 @@
 from pathlib import Path
-from typing import Optional
+from typing import AsyncContextManager, Callable, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import sqlite3
+import threading
+import time
+
 import aiofiles
+
+from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.errors import (
+    CircuitOpenError,
+    ParsingError,
+    TransientError,
+)
+from anime_wallpaper_changer.core.library import (
+    LIBRARY_FILE_NAME,
+    DiskQuota,
+    LibraryEntry,
+    LibraryIndex,
+    RescanResult,
+)
+from anime_wallpaper_changer.core.parser import ImageStream
+from anime_wallpaper_changer.core.resilience import RetryPolicy
+from anime_wallpaper_changer.core.rotation import OfflineRotation
+from anime_wallpaper_changer.core.store import (
+    HASH_ALGORITHM,
+    STORE_FOLDER_NAME,
+    ContentStore,
+    file_digest,
+)
 from anime_wallpaper_changer.utils.logger import setup_logger
+from anime_wallpaper_changer.utils.storage import FSYNC_MODES, fsync_directory
 
 logger = setup_logger(__name__)
 
+PARTIAL_SUFFIX = ".part"
+TEMP_SUFFIXES = (".tmp", ".link")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+# Временный файл живет, пока пишется одно изображение; более старые
+# остались от прерванной записи
+TEMP_MAX_AGE = 60
+PARTIAL_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def fsync_file(path: Path) -> None:
+    """Сброс содержимого файла на диск"""
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+
 
 class ImageSaver:
     """
     Класс для сохранения изображений на диск.
 
     Обеспечивает асинхронное сохранение изображений в указанную директорию
-    с обработкой ошибок и логированием.
+    с обработкой ошибок и логированием. В режиме хранения по содержимому
+    каждое изображение хранится один раз, а файлы в директории являются
+    ссылками на него. Сохраненные изображения могут учитываться в индексе
+    библиотеки, по которому соблюдается квота на место на диске.
+
+    Файлы появляются под итоговым именем только целиком: данные пишутся во
+    временный файл в той же директории, при необходимости сбрасываются на
+    диск и переименовываются.
     """
 
-    def __init__(self, output_dir: Path) -> None:
+    def __init__(
+        self,
+        output_dir: Path,
+        content_addressed: bool = False,
+        indexed: bool = False,
+        quota: Optional[DiskQuota] = None,
+        fsync: str = "off",
+        fsync_batch: int = 32,
+    ) -> None:
         """
         Инициализация сохранятеля изображений.
 
         Args:
             output_dir (Path): Директория для сохранения изображений.
                              Будет создана, если не существует.
+            content_addressed (bool): Хранить изображения по хешу содержимого
+                             в скрытой поддиректории
+            indexed (bool): Вести индекс библиотеки в файле SQLite
+                             в директории сохранения
+            quota (Optional[DiskQuota]): Ограничение размера библиотеки,
+                             требует индекса
+            fsync (str): Сброс на диск перед переименованием: "off" - нет,
+                             "always" - файл и директория при каждом сохранении,
+                             "batch" - файл при каждом сохранении, директория
+                             раз в fsync_batch сохранений и при flush()
+            fsync_batch (int): Размер пакета в режиме "batch"
+
+        Raises:
+            ValueError: Если квота задана без индекса библиотеки
+                или режим сброса неизвестен
         """
+        if quota is not None and not indexed:
+            raise ValueError("Квота на место на диске требует индекса библиотеки")
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"Неизвестный режим сброса на диск: {fsync}")
         self.output_dir: Path = output_dir
+        self.store: Optional[ContentStore] = (
+            ContentStore(output_dir / STORE_FOLDER_NAME) if content_addressed else None
+        )
+        self.library: Optional[LibraryIndex] = (
+            LibraryIndex(output_dir / LIBRARY_FILE_NAME) if indexed else None
+        )
+        self.rotation: Optional[OfflineRotation] = (
+            OfflineRotation(self.library, output_dir) if self.library else None
+        )
+        self.quota: Optional[DiskQuota] = quota
+        self.current: Optional[str] = None
+        self.held: Set[str] = set()
+        self.fsync: str = fsync
+        self.fsync_batch: int = fsync_batch
+        self._unsynced: Set[Path] = set()
+        self._unsynced_count: int = 0
+        self._sync_lock: threading.Lock = threading.Lock()
         self._ensure_output_dir_exists()
+        self._recover()
+
+    @classmethod
+    def from_config(cls, config: Config) -> "ImageSaver":
+        """
+        Сохранятель с настройками приложения.
+
+        Args:
+            config (Config): Настройки с директорией сохранения, режимом
+                             хранения, индексом и квотой
+
+        Returns:
+            ImageSaver: Сохранятель для директории config.OUTPUT_DIR
+        """
+        quota = None
+        if config.DISK_QUOTA_BYTES is not None or config.DISK_QUOTA_FILES is not None:
+            quota = DiskQuota(
+                config.DISK_QUOTA_BYTES, config.DISK_QUOTA_FILES, config.EVICTION_POLICY
+            )
+        return cls(
+            config.OUTPUT_DIR,
+            content_addressed=config.CONTENT_STORE,
+            indexed=config.LIBRARY_INDEX or quota is not None,
+            quota=quota,
+            fsync=config.FSYNC_MODE,
+            fsync_batch=config.FSYNC_BATCH_SIZE,
+        )
 
     def _ensure_output_dir_exists(self) -> None:
         """Создает директорию для сохранения, если она не существует."""
         if not self.output_dir.exists():
             self.output_dir.mkdir(parents=True, exist_ok=True)
 
-    async def save_image(self, image_data: bytes, filename: str) -> Optional[Path]:
+    def _recover(self) -> None:
+        """
+        Удаление файлов, оставшихся после аварийного завершения.
+
+        Удаляются временные файлы незавершенных сохранений, в том числе
+        в хранилище по содержимому, и давно заброшенные частичные загрузки;
+        недавние частичные загрузки остаются для докачки.
+        """
+        now = time.time()
+        removed = 0
+        directories = [self.output_dir]
+        store_root = self.output_dir / STORE_FOLDER_NAME
+        try:
+            if store_root.is_dir():
+                directories.append(store_root)
+                directories.extend(
+                    path for path in store_root.iterdir() if path.is_dir()
+                )
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать хранилище {store_root}: {e}")
+
+        for directory in directories:
+            try:
+                for path in directory.iterdir():
+                    if path.name.startswith(".") and path.suffix in TEMP_SUFFIXES:
+                        max_age = TEMP_MAX_AGE
+                    elif path.suffix == PARTIAL_SUFFIX:
+                        max_age = PARTIAL_MAX_AGE
+                    else:
+                        continue
+                    if now - path.lstat().st_mtime > max_age:
+                        path.unlink(missing_ok=True)
+                        removed += 1
+            except OSError as e:
+                logger.warning(f"Не удалось очистить директорию {directory}: {e}")
+        if removed:
+            logger.info(f"Удалено незавершенных файлов: {removed}")
+
+    def _temp_path(self, filename: str) -> Path:
+        """Временный файл для записи в директории сохранения"""
+        return self.output_dir / f".{filename}{TEMP_SUFFIXES[0]}"
+
+    def list_images(self) -> List[Path]:
+        """
+        Список сохраненных изображений.
+
+        Returns:
+            List[Path]: Пути к файлам изображений в директории сохранения
+        """
+        try:
+            return [
+                path
+                for path in self.output_dir.iterdir()
+                if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES
+            ]
+        except OSError as e:
+            logger.error(f"Ошибка при чтении директории {self.output_dir}: {e}")
+            return []
+
+    def pick_local(
+        self, category: Optional[str] = None, resolution: Optional[str] = None
+    ) -> Optional[Path]:
+        """
+        Выбор ранее сохраненного изображения без обращения к сети.
+
+        С индексом библиотеки выбирается давно не показанное изображение
+        каталога за постоянное время, без индекса - случайный файл.
+
+        Args:
+            category (Optional[str]): Категория каталога
+            resolution (Optional[str]): Разрешение каталога
+
+        Returns:
+            Optional[Path]: Путь к изображению или None, если их нет
+        """
+        if self.rotation is not None:
+            try:
+                return self.rotation.pick(category, resolution)
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось прочитать индекс библиотеки: {e}")
+        local_images = self.list_images()
+        return random.choice(local_images) if local_images else None
+
+    async def save_image(
+        self,
+        image_data: bytes,
+        filename: str,
+        url: Optional[str] = None,
+        category: Optional[str] = None,
+        resolution: Optional[str] = None,
+    ) -> Optional[Path]:
         """
         Асинхронное сохранение изображения на диск.
 
         Args:
             image_data (bytes): Бинарные данные изображения для сохранения
             filename (str): Имя файла для сохраняемого изображения
+            url (Optional[str]): Адрес изображения для индекса библиотеки
+            category (Optional[str]): Категория каталога для индекса библиотеки
+            resolution (Optional[str]): Разрешение каталога для индекса библиотеки
 
         Returns:
             Optional[Path]: Путь к сохраненному файлу или None в случае ошибки
@@ -45,12 +263,488 @@ class ImageSaver:
             IOError: При ошибках записи файла
             OSError: При системных ошибках работы с файлами
         """
+        digest: Optional[str] = None
+        temp_path = self._temp_path(filename)
         try:
-            image_path = self.output_dir / filename
-            async with aiofiles.open(image_path, mode="wb") as file:
-                await file.write(image_data)
-            logger.info(f"Изображение успешно сохранено: {image_path}")
-            return image_path
+            stored = None
+            if self.store is not None:
+                digest = hashlib.sha256(image_data).hexdigest()
+                stored = self.store.get(digest)
+            if stored is not None:
+                image_path = await asyncio.to_thread(
+                    self._link_stored, stored, filename
+                )
+            else:
+                async with aiofiles.open(temp_path, mode="wb") as file:
+                    await file.write(image_data)
+                image_path = await asyncio.to_thread(
+                    self._commit, temp_path, filename, digest
+                )
         except (IOError, OSError) as e:
             logger.error(f"Ошибка при сохранении изображения {filename}: {e}")
+            temp_path.unlink(missing_ok=True)
+            return None
+        await self._index(image_path, url, category, resolution, digest)
+        logger.info(f"Изображение успешно сохранено: {image_path}")
+        return image_path
+
+    async def save_stream(
+        self,
+        open_stream: Callable[[int], AsyncContextManager[ImageStream]],
+        filename: str,
+        attempts: int = 3,
+        retry_policy: Optional[RetryPolicy] = None,
+        url: Optional[str] = None,
+        validate: Optional[Callable[[Path], bool]] = None,
+        category: Optional[str] = None,
+        resolution: Optional[str] = None,
+    ) -> Optional[Path]:
+        """
+        Потоковое сохранение изображения с докачкой.
+
+        Данные пишутся по частям во временный файл рядом с целевым, поэтому
+        потребление памяти не зависит от размера изображения. Оборванная
+        загрузка продолжается с места обрыва, а файл переименовывается
+        в итоговое имя только после получения всех данных.
+
+        С хранилищем по содержимому хеш считается во время загрузки,
+        а изображение, уже загруженное по тому же адресу, не скачивается.
+
+        Args:
+            open_stream (Callable): Открывает поток изображения с заданного смещения
+            filename (str): Имя файла для сохраняемого изображения
+            attempts (int): Количество попыток загрузки
+            retry_policy (Optional[RetryPolicy]): Паузы между попытками при
+                временных ошибках сети
+            url (Optional[str]): Адрес изображения для поиска в хранилище
+            validate (Optional[Callable]): Проверка загруженного файла
+                перед сохранением
+            category (Optional[str]): Категория каталога для индекса библиотеки
+            resolution (Optional[str]): Разрешение каталога для индекса библиотеки
+
+        Returns:
+            Optional[Path]: Путь к сохраненному файлу или None при ошибке записи
+
+        Raises:
+            ParsingError: Если изображение не удалось загрузить за все попытки
+                или оно не прошло проверку
+        """
+        if self.store is not None and url is not None:
+            stored = self.store.find_url(url)
+            if stored is not None:
+                try:
+                    image_path = await asyncio.to_thread(
+                        self._link_stored, stored, filename
+                    )
+                except OSError as e:
+                    logger.error(f"Ошибка при сохранении изображения {filename}: {e}")
+                    return None
+                await self._index(image_path, url, category, resolution, stored.name)
+                logger.info(f"Изображение взято из хранилища: {image_path}")
+                return image_path
+
+        partial_path = self.output_dir / f"{filename}{PARTIAL_SUFFIX}"
+        last_error: Optional[ParsingError] = None
+        digest: Optional[str] = None
+
+        for attempt in range(attempts):
+            offset = partial_path.stat().st_size if partial_path.exists() else 0
+            try:
+                async with open_stream(offset) as stream:
+                    if stream.offset not in (0, offset):
+                        raise ParsingError(
+                            f"Сервер вернул неожиданное смещение {stream.offset}"
+                        )
+                    hasher = await self._start_hash(partial_path, stream.offset)
+                    mode = "ab" if stream.offset else "wb"
+                    async with aiofiles.open(partial_path, mode=mode) as file:
+                        async for chunk in stream.chunks:
+                            await file.write(chunk)
+                            if hasher is not None:
+                                hasher.update(chunk)
+                    total = stream.total
+
+                received = partial_path.stat().st_size
+                if total is not None and received < total:
+                    raise ParsingError(f"Получено {received} из {total} байт")
+
+                digest = hasher.hexdigest() if hasher is not None else None
+                break
+            except CircuitOpenError:
+                raise
+            except ParsingError as e:
+                logger.warning(f"Загрузка {filename} прервана: {e}")
+                last_error = e
+                if isinstance(e, TransientError) and retry_policy is not None:
+                    if attempt + 1 < attempts:
+                        await asyncio.sleep(retry_policy.delay(attempt))
+            except (IOError, OSError) as e:
+                logger.error(f"Ошибка при сохранении изображения {filename}: {e}")
+                return None
+        else:
+            raise last_error or ParsingError(f"Не удалось загрузить {filename}")
+
+        if validate is not None and not await asyncio.to_thread(validate, partial_path):
+            partial_path.unlink(missing_ok=True)
+            raise ParsingError(f"Некорректное изображение: {filename}")
+
+        try:
+            image_path = await asyncio.to_thread(
+                self._commit, partial_path, filename, digest
+            )
+        except (IOError, OSError) as e:
+            logger.error(f"Ошибка при сохранении изображения {filename}: {e}")
+            return None
+
+        if self.store is not None and url is not None and digest is not None:
+            await self.store.remember_url(url, digest)
+        await self._index(image_path, url, category, resolution, digest)
+        logger.info(f"Изображение успешно сохранено: {image_path}")
+        return image_path
+
+    async def import_file(
+        self,
+        path: Path,
+        filename: str,
+        url: Optional[str] = None,
+        category: Optional[str] = None,
+        resolution: Optional[str] = None,
+    ) -> Path:
+        """
+        Перенос готового файла в директорию сохранения.
+
+        Args:
+            path (Path): Файл изображения, например из папки предзагрузки
+            filename (str): Имя файла в директории сохранения
+            url (Optional[str]): Адрес изображения для индекса библиотеки
+            category (Optional[str]): Категория каталога для индекса библиотеки
+            resolution (Optional[str]): Разрешение каталога для индекса библиотеки
+
+        Returns:
+            Path: Путь к файлу в директории сохранения
+
+        Raises:
+            OSError: При ошибках работы с файлами
+        """
+
+        def move() -> Tuple[Path, Optional[str]]:
+            # Файл из другой файловой системы копируется, поэтому сначала
+            # переносится во временный файл рядом с итоговым
+            temp_path = self._temp_path(filename)
+            try:
+                shutil.move(path, temp_path)
+                digest = file_digest(temp_path) if self.store is not None else None
+                return self._commit(temp_path, filename, digest), digest
+            except OSError:
+                temp_path.unlink(missing_ok=True)
+                raise
+
+        image_path, digest = await asyncio.to_thread(move)
+        await self._index(image_path, url, category, resolution, digest)
+        return image_path
+
+    async def discard(self, image_path: Path) -> None:
+        """
+        Удаление сохраненного изображения.
+
+        Объект хранилища удаляется вместе с файлом, если других жестких
+        ссылок на него не осталось.
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+        """
+
+        try:
+            await asyncio.to_thread(self._remove, image_path)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Не удалось удалить изображение {image_path}: {e}")
+        if self.rotation is not None:
+            self.rotation.remove(image_path.name)
+
+    def _remove(self, image_path: Path, digest: Optional[str] = None) -> None:
+        """Удаление файла вместе с неиспользуемым объектом хранилища и записью индекса"""
+        stored = self._stored_object(image_path, digest)
+        image_path.unlink(missing_ok=True)
+        self._release_object(stored)
+        if self.library is not None:
+            self.library.remove(image_path.name)
+
+    def _stored_object(
+        self, image_path: Path, digest: Optional[str] = None
+    ) -> Optional[Path]:
+        """Объект хранилища, на который жестко ссылается файл"""
+        if self.store is None or not image_path.is_file() or image_path.is_symlink():
+            return None
+        return self.store.get(digest or file_digest(image_path))
+
+    @staticmethod
+    def _release_object(stored: Optional[Path]) -> None:
+        """Удаление объекта хранилища, на который не осталось ссылок"""
+        if stored is not None and stored.stat().st_nlink <= 1:
+            stored.unlink()
+
+    async def replace_content(
+        self, image_path: Path, write: Callable[[Path], Optional[Path]]
+    ) -> Optional[Path]:
+        """
+        Замена содержимого сохраненного изображения, например после эффектов.
+
+        Новое содержимое записывается во временный файл и сохраняется как
+        обычная загрузка: с хранилищем по содержимому оно становится новым
+        объектом, имя перенаправляется на него, а старый объект удаляется,
+        если на него больше нет ссылок. Запись индекса библиотеки
+        обновляется, источник и счетчики показов сохраняются.
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+            write (Callable): Записывает новое содержимое по переданному пути,
+                возвращает None при ошибке
+
+        Returns:
+            Optional[Path]: Путь к обновленному файлу или None при ошибке
+        """
+        if image_path.parent != self.output_dir:
+            return await asyncio.to_thread(write, image_path)
+
+        temp_path = self._temp_path(image_path.name)
+        try:
+            if await asyncio.to_thread(write, temp_path) is None:
+                temp_path.unlink(missing_ok=True)
+                return None
+            digest = await asyncio.to_thread(self._replace, temp_path, image_path)
+        except (IOError, OSError) as e:
+            logger.error(f"Ошибка при замене изображения {image_path.name}: {e}")
+            temp_path.unlink(missing_ok=True)
             return None
+        await self._index(image_path, None, None, None, digest)
+        logger.info(f"Изображение обновлено: {image_path}")
+        return image_path
+
+    def _replace(self, temp_path: Path, image_path: Path) -> Optional[str]:
+        """Перенос нового содержимого под существующее имя, возвращает его хеш"""
+        previous = self._stored_object(image_path)
+        if self.fsync != "off":
+            fsync_file(temp_path)
+        if self.store is None:
+            os.replace(temp_path, image_path)
+            self._renamed(self.output_dir)
+            return None
+
+        digest = file_digest(temp_path)
+        stored = self.store.add(temp_path, digest)
+        self._renamed(stored.parent)
+        ContentStore.link(stored, image_path)
+        self._renamed(self.output_dir)
+        if previous != stored:
+            self._release_object(previous)
+        return digest
+
+    def set_favourite(self, image_path: Path, favourite: bool = True) -> None:
+        """
+        Пометка изображения как избранного.
+
+        Избранные изображения не удаляются при превышении квоты.
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+            favourite (bool): Добавить в избранное или убрать из него
+        """
+        if self.library is None or image_path.parent != self.output_dir:
+            return
+        try:
+            self.library.set_favourite(image_path.name, favourite)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось обновить индекс библиотеки: {e}")
+
+    def hold(self, image_path: Path) -> None:
+        """
+        Защита изображения от удаления по квоте, пока оно нужно интерфейсу.
+
+        Например, скачанные, но еще не установленные обои: фоновое сохранение
+        может превысить квоту раньше, чем их установят.
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+        """
+        if image_path.parent == self.output_dir:
+            self.held.add(image_path.name)
+
+    def release(self, image_path: Path) -> None:
+        """
+        Снятие защиты, установленной hold().
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+        """
+        if image_path.parent == self.output_dir:
+            self.held.discard(image_path.name)
+
+    async def _enforce_quota(self, keep: Optional[Path] = None) -> None:
+        """Удаление изображений по политике вытеснения, пока библиотека больше квоты"""
+        if self.quota is None or self.library is None:
+            return
+        quota, library = self.quota, self.library
+        protected: Set[str] = {name for name in (self.current,) if name}
+        protected.update(self.held)
+        if keep is not None:
+            protected.add(keep.name)
+
+        def evict() -> List[str]:
+            evicted: List[str] = []
+            while quota.exceeded(*library.usage(by_content=self.store is not None)):
+                entry = library.next_to_evict(quota.policy, protected)
+                if entry is None:
+                    logger.warning("Квота превышена, но удалять больше нечего")
+                    break
+                self._remove(self.output_dir / entry.name, entry.sha256)
+                evicted.append(entry.name)
+            return evicted
+
+        try:
+            evicted = await asyncio.to_thread(evict)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Не удалось освободить место в библиотеке: {e}")
+            return
+        for name in evicted:
+            if self.rotation is not None:
+                self.rotation.remove(name)
+        if evicted:
+            logger.info(f"Удалено по квоте изображений: {len(evicted)}")
+
+    async def rescan(self) -> Optional[RescanResult]:
+        """
+        Сверка индекса библиотеки с файлами в директории сохранения.
+
+        Заново анализируются только новые файлы и файлы с изменившимися
+        размером или временем изменения.
+
+        Returns:
+            Optional[RescanResult]: Найденные изменения или None без индекса
+        """
+        if self.library is None:
+            return None
+        try:
+            result = await asyncio.to_thread(self.library.rescan, self.list_images())
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось обновить индекс библиотеки: {e}")
+            return None
+        if self.rotation is not None:
+            self.rotation.reset()
+        logger.info(f"Индекс библиотеки обновлен: {result}")
+        await self._enforce_quota()
+        return result
+
+    def record_shown(self, image_path: Path) -> None:
+        """
+        Учет показа изображения в качестве обоев.
+
+        Args:
+            image_path (Path): Путь к файлу в директории сохранения
+        """
+        if self.library is None or image_path.parent != self.output_dir:
+            return
+        self.current = image_path.name
+        if self.rotation is not None:
+            self.rotation.mark_shown(image_path.name)
+        try:
+            self.library.record_shown(image_path.name)
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось обновить индекс библиотеки: {e}")
+
+    async def _index(
+        self,
+        image_path: Path,
+        url: Optional[str],
+        category: Optional[str],
+        resolution: Optional[str],
+        digest: Optional[str],
+    ) -> None:
+        """Добавление сохраненного изображения в индекс библиотеки"""
+        if self.library is None:
+            return
+        library = self.library
+
+        def add() -> Optional[LibraryEntry]:
+            library.add(image_path, url, category, resolution, digest)
+            return library.get(image_path.name)
+
+        try:
+            entry = await asyncio.to_thread(add)
+        except (OSError, SyntaxError, sqlite3.Error) as e:
+            logger.warning(f"Не удалось добавить {image_path} в индекс библиотеки: {e}")
+            return
+        if entry is not None and self.rotation is not None:
+            self.rotation.add(entry.name, entry.category, entry.resolution)
+        await self._enforce_quota(keep=image_path)
+
+    async def _start_hash(
+        self, partial_path: Path, offset: int
+    ) -> Optional["hashlib._Hash"]:
+        """Хеш для новой загрузки с учетом уже полученной части файла"""
+        if self.store is None:
+            return None
+        if not offset:
+            return hashlib.new(HASH_ALGORITHM)
+
+        def hash_partial() -> "hashlib._Hash":
+            with open(partial_path, "rb") as file:
+                return hashlib.file_digest(file, HASH_ALGORITHM)
+
+        return await asyncio.to_thread(hash_partial)
+
+    def _commit(self, partial_path: Path, filename: str, digest: Optional[str]) -> Path:
+        """Перенос загруженного файла под итоговое имя"""
+        if self.fsync != "off":
+            fsync_file(partial_path)
+        if self.store is None or digest is None:
+            image_path = self.output_dir / filename
+            os.replace(partial_path, image_path)
+            self._renamed(self.output_dir)
+            return image_path
+        stored = self.store.add(partial_path, digest)
+        self._renamed(stored.parent)
+        return self._link_stored(stored, filename)
+
+    def _renamed(self, directory: Path) -> None:
+        """Учет измененной директории, ее сброс на диск по режиму fsync"""
+        if self.fsync == "off":
+            return
+        with self._sync_lock:
+            self._unsynced.add(directory)
+            self._unsynced_count += 1
+            if self.fsync == "batch" and self._unsynced_count < self.fsync_batch:
+                return
+            directories, self._unsynced = self._unsynced, set()
+            self._unsynced_count = 0
+        for path in directories:
+            fsync_directory(path)
+
+    async def flush(self) -> None:
+        """Сброс на диск директорий, измененных с последнего сброса"""
+        with self._sync_lock:
+            directories, self._unsynced = self._unsynced, set()
+            self._unsynced_count = 0
+        try:
+            for path in directories:
+                await asyncio.to_thread(fsync_directory, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сбросить директорию на диск: {e}")
+
+    def _link_stored(self, stored: Path, filename: str) -> Path:
+        """
+        Ссылка на объект хранилища в директории сохранения.
+
+        Если имя уже занято другим изображением, к нему добавляется
+        начало хеша, чтобы не перезаписать существующий файл.
+        """
+        image_path = self.output_dir / filename
+        if image_path.exists() and not (
+            image_path.samefile(stored) or file_digest(image_path) == stored.name
+        ):
+            image_path = image_path.with_name(
+                f"{image_path.stem}_{stored.name[:8]}{image_path.suffix}"
+            )
+        if not image_path.exists() or not image_path.samefile(stored):
+            ContentStore.link(stored, image_path)
+            self._renamed(self.output_dir)
+        return image_path
@@ -0,0 +1,116 @@
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+import shutil
+
+import aiofiles
+
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+STORE_FOLDER_NAME = ".objects"
+HASH_ALGORITHM = "sha256"
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of the file contents as a hex string"""
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, HASH_ALGORITHM).hexdigest()
+
+
+class ContentStore:
+    """
+    Content-addressed storage of wallpaper files.
+
+    Every distinct image is stored once as ``<root>/<ab>/<sha256>``; the
+    human-readable names in the output folder are hard links to these
+    objects (symbolic links or copies where hard links are not supported).
+    A persistent URL to hash map lets known images be linked again without
+    downloading them.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = root
+        self.url_map_file: Path = root / "urls.jsonl"
+        self._urls: Optional[Dict[str, str]] = None
+
+    def object_path(self, digest: str) -> Path:
+        """Path of the stored object with the given hash"""
+        return self.root / digest[:2] / digest
+
+    def get(self, digest: str) -> Optional[Path]:
+        """Stored object with the given hash, if present"""
+        path = self.object_path(digest)
+        return path if path.exists() else None
+
+    def _load_urls(self) -> Dict[str, str]:
+        """Load URL to hash map from disk once"""
+        if self._urls is not None:
+            return self._urls
+
+        self._urls = {}
+        try:
+            with open(self.url_map_file, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        url, digest = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._urls[url] = digest
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать карту адресов хранилища: {e}")
+        return self._urls
+
+    def find_url(self, url: str) -> Optional[Path]:
+        """Stored object previously downloaded from the URL"""
+        digest = self._load_urls().get(url)
+        return self.get(digest) if digest else None
+
+    async def remember_url(self, url: str, digest: str) -> None:
+        """Map URL to the hash of the image downloaded from it"""
+        urls = self._load_urls()
+        if urls.get(url) == digest:
+            return
+        urls[url] = digest
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(
+                self.url_map_file, mode="a", encoding="utf-8"
+            ) as file:
+                await file.write(json.dumps([url, digest]) + "\n")
+        except OSError as e:
+            logger.warning(f"Не удалось обновить карту адресов хранилища: {e}")
+
+    def add(self, path: Path, digest: str) -> Path:
+        """
+        Move file into the store under its hash.
+
+        If the same content is already stored, the file is removed instead.
+        """
+        target = self.object_path(digest)
+        if target.exists():
+            path.unlink()
+            logger.info(f"Изображение уже есть в хранилище: {digest[:12]}")
+            return target
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(path, target)
+        return target
+
+    @staticmethod
+    def link(source: Path, target: Path) -> None:
+        """Atomically point target name at the stored object"""
+        tmp_path = target.with_name(f".{target.name}.link")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            try:
+                os.symlink(source.resolve(), tmp_path)
+            except OSError:
+                shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, target)
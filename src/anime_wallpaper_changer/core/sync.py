@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Set
+import time
+
+from anime_wallpaper_changer.core.crawler import CrawlStats, Crawler
+from anime_wallpaper_changer.utils.logger import setup_logger
+from anime_wallpaper_changer.utils.storage import read_json, write_json
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class SyncState:
+    """Wallpapers of one catalog already mirrored to the library"""
+
+    known: Set[str] = field(default_factory=set)
+    complete: bool = False
+    synced_at: float = 0.0
+
+
+class SyncStateStore:
+    """
+    Persistent sync state per catalog (category and resolution).
+
+    Stored in a single JSON file as the list of known wallpaper links and
+    whether the last sync walked the catalog to its end or to a known page.
+    """
+
+    def __init__(self, state_file: Path) -> None:
+        self.state_file: Path = state_file
+        self._states: Optional[Dict[str, SyncState]] = None
+
+    def _load(self) -> Dict[str, SyncState]:
+        """Load sync states from disk once"""
+        if self._states is None:
+            self._states = {}
+            data = read_json(self.state_file)
+            if isinstance(data, dict):
+                for catalog_path, state in data.items():
+                    try:
+                        self._states[catalog_path] = SyncState(
+                            known=set(state["known"]),
+                            complete=bool(state["complete"]),
+                            synced_at=float(state["synced_at"]),
+                        )
+                    except (KeyError, TypeError, ValueError):
+                        continue
+        return self._states
+
+    def get(self, catalog_path: str) -> SyncState:
+        """Get sync state of the catalog, empty if it was never synced"""
+        return self._load().setdefault(catalog_path, SyncState())
+
+    async def save(self) -> None:
+        """Persist sync states"""
+        await write_json(
+            self.state_file,
+            {
+                path: {
+                    "known": sorted(state.known),
+                    "complete": state.complete,
+                    "synced_at": state.synced_at,
+                }
+                for path, state in self._load().items()
+            },
+        )
+
+
+class CatalogSync:
+    """
+    Incremental mirror of a catalog into the output folder.
+
+    Catalog pages are listed newest first, so after a complete sync only
+    the first pages can hold new wallpapers: the walk stops at the first
+    page without unknown links, and a nightly run costs a few conditional
+    requests. An interrupted sync is resumed by walking the whole catalog
+    again, downloading only what is still missing.
+    """
+
+    def __init__(self, crawler: Crawler, state_store: SyncStateStore) -> None:
+        self.crawler: Crawler = crawler
+        self.state_store: SyncStateStore = state_store
+
+    async def run(self) -> CrawlStats:
+        """Download wallpapers added since the last sync"""
+        catalog_path = self.crawler.parser.catalog_path
+        state = self.state_store.get(catalog_path)
+        if state.known and not state.complete:
+            logger.info("Предыдущая синхронизация не завершена, проверяем весь каталог")
+
+        finished = False
+        try:
+            stats = await self.crawler.run(
+                known=frozenset(state.known), stop_at_known=state.complete
+            )
+            finished = True
+        finally:
+            state.known.update(self.crawler.completed)
+            state.complete = finished and self.crawler.stats.failures == 0
+            state.synced_at = time.time()
+            await self.state_store.save()
+
+        logger.info(
+            f"Синхронизация {catalog_path}: прочитано страниц "
+            f"{self.crawler.pages_read}, новых обоев {stats.images}"
+        )
+        return stats
@@ -1,17 +1,23 @@
 import asyncio
+import time
 from pathlib import Path
 from typing import Optional
 
-import aiohttp
 from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtGui import QKeySequence, QPixmap, QShortcut, QImage
+from PyQt6.QtGui import QKeySequence, QPixmap, QShortcut
 from PyQt6.QtWidgets import QFileDialog, QHBoxLayout, QMainWindow, QVBoxLayout, QWidget
 
 from anime_wallpaper_changer.core.config import Config
-from anime_wallpaper_changer.core.parser import ParsingError, WallpapersCraftParser
+from anime_wallpaper_changer.core.http import HttpClient
+from anime_wallpaper_changer.core.parser import WallpapersCraftParser
+from anime_wallpaper_changer.core.prefetch import PrefetchQueue
 from anime_wallpaper_changer.core.saver import ImageSaver
 from anime_wallpaper_changer.core.wallpaper import WallpaperSetter
-from anime_wallpaper_changer.core.effects import ImageEffect
+from anime_wallpaper_changer.core.effects import (
+    EffectStack,
+    ImageEffect,
+    PreviewFrame,
+)
 from anime_wallpaper_changer.ui.components import (
     PreviewLabel,
     StyledButton,
@@ -21,6 +27,11 @@ from anime_wallpaper_changer.ui.components import (
     TitleBar,
     EffectPanel,
 )
+from anime_wallpaper_changer.ui.preview import (
+    PreviewRenderer,
+    PreviewRequest,
+    frame_to_qimage,
+)
 from anime_wallpaper_changer.ui.styles import style_manager
 from anime_wallpaper_changer.utils.constants import CATEGORIES, RESOLUTIONS
 from anime_wallpaper_changer.utils.logger import setup_logger
@@ -37,10 +48,23 @@ class MainWindow(QMainWindow):
 
         # Инициализация компонентов
         self.config = Config()
-        self.parser = WallpapersCraftParser(self.config)
-        self.saver = ImageSaver(self.config.OUTPUT_DIR)
+        self.http_client = HttpClient(self.config)
+        self.parser = WallpapersCraftParser(self.config, self.http_client)
+        self.saver = ImageSaver.from_config(self.config)
+        self.prefetch_queue = PrefetchQueue(self.parser, self.saver, self.config)
+        self._library_task: Optional["asyncio.Task[object]"] = None
         self.wallpaper_setter = WallpaperSetter()
         self.current_wallpaper: Optional[Path] = None
+        # Примененные эффекты, файл меняется только при установке обоев
+        self.effect_stack = EffectStack()
+        ImageEffect.set_backend(self.config.EFFECT_BACKEND)
+
+        # Превью эффектов рисуется в отдельном потоке
+        self.preview_renderer = PreviewRenderer(self)
+        self.preview_renderer.rendered.connect(self._show_effect_preview)
+        self.preview_renderer.failed.connect(self._effect_preview_failed)
+        self.preview_renderer.start()
+        self._shown_generation = 0
 
         # Создаем центральный виджет
         central_widget = QWidget()
@@ -71,6 +95,10 @@ class MainWindow(QMainWindow):
         # Применяем стили
         self.setStyleSheet(style_manager.get_styles())
 
+        # Начинаем подготовку обоев после запуска цикла событий
+        QTimer.singleShot(0, self._update_prefetch_catalog)
+        QTimer.singleShot(0, self._rescan_library)
+
     def _init_left_panel(self, parent_layout: QHBoxLayout) -> None:
         """Инициализация левой панели с превью и кнопками"""
         left_container = QWidget()
@@ -111,6 +139,14 @@ class MainWindow(QMainWindow):
             self.set_wallpaper_button, alignment=Qt.AlignmentFlag.AlignCenter
         )
 
+        self.favourite_button = StyledButton("⭐ В избранное", width=200)
+        self.favourite_button.clicked.connect(self.add_to_favourites)
+        self.favourite_button.setEnabled(False)
+        self.favourite_button.setToolTip("Избранные обои не удаляются по квоте")
+        buttons_layout.addWidget(
+            self.favourite_button, alignment=Qt.AlignmentFlag.AlignCenter
+        )
+
         left_layout.addLayout(buttons_layout)
 
         # Прогресс и статус
@@ -155,12 +191,14 @@ class MainWindow(QMainWindow):
         category_label = StyledLabel("Категория:", centered=False)
         settings_layout.addWidget(category_label)
         self.category_combo = StyledComboBox(list(CATEGORIES.keys()), width=300)
+        self.category_combo.currentTextChanged.connect(self.on_category_changed)
         settings_layout.addWidget(self.category_combo)
 
         # Разрешение
         resolution_label = StyledLabel("Разрешение:", centered=False)
         settings_layout.addWidget(resolution_label)
         self.resolution_combo = StyledComboBox(list(RESOLUTIONS.keys()), width=300)
+        self.resolution_combo.currentTextChanged.connect(self.on_resolution_changed)
         settings_layout.addWidget(self.resolution_combo)
 
         right_layout.addWidget(settings_container)
@@ -211,20 +249,53 @@ class MainWindow(QMainWindow):
         if directory:
             new_path = Path(directory)
             self.config.OUTPUT_DIR = new_path
-            self.saver = ImageSaver(self.config.OUTPUT_DIR)
+            self.saver = ImageSaver.from_config(self.config)
+            if self.current_wallpaper is not None:
+                self.saver.hold(self.current_wallpaper)
+            self.prefetch_queue.saver = self.saver
+            self._rescan_library()
             self.output_dir_label.setText(str(new_path))
             logger.info(f"Изменена директория сохранения: {new_path}")
 
     def on_category_changed(self, category_text: str) -> None:
         """Обработчик изменения категории"""
         self.status_label.setText(f"Выбрана категория: {category_text}")
+        self._update_prefetch_catalog()
 
     def on_resolution_changed(self, resolution_text: str) -> None:
         """Обработчик изменения разрешения"""
         self.status_label.setText(f"Выбрано разрешение: {resolution_text}")
+        self._update_prefetch_catalog()
+
+    def _update_prefetch_catalog(self) -> None:
+        """Переключение очереди подготовленных обоев на выбранный каталог"""
+        category = self.category_combo.currentText()
+        resolution = self.resolution_combo.currentText()
+        self.prefetch_queue.set_catalog(
+            self.config.get_catalog_path(CATEGORIES[category], RESOLUTIONS[resolution])
+        )
+
+    def _rescan_library(self) -> None:
+        """
+        Фоновая сверка индекса библиотеки с папкой сохранения.
+
+        Нужна только при открытии библиотеки: дальше сохранятель сам
+        обновляет записи измененных файлов.
+        """
+        if self._library_task is None or self._library_task.done():
+            self._library_task = asyncio.create_task(self.saver.rescan())
+
+    def _set_current_wallpaper(self, image_path: Path) -> None:
+        """Смена обоев, ожидающих установки; они защищены от удаления по квоте"""
+        if self.current_wallpaper is not None:
+            self.saver.release(self.current_wallpaper)
+        self.current_wallpaper = image_path
+        self.saver.hold(image_path)
 
     def update_preview(self) -> None:
         """Обновить превью изображения"""
+        # Превью эффектов, запрошенные раньше, больше не показываем
+        self._shown_generation = self.preview_renderer.generation
         if self.current_wallpaper and self.current_wallpaper.exists():
             pixmap = QPixmap(str(self.current_wallpaper))
             scaled_pixmap = pixmap.scaled(
@@ -239,20 +310,34 @@ class MainWindow(QMainWindow):
         if not self.current_wallpaper:
             self.status_label.setText("❌ Сначала скачайте изображение")
             return
+        if not self.set_wallpaper_button.isEnabled():
+            return
+        asyncio.create_task(self._set_wallpaper(self.current_wallpaper))
 
-        # Применяем эффект перед установкой
-        effect_name = self.effect_panel.effect_combo.currentText()
-        intensity = self.effect_panel.intensity_slider.get_value()
-
-        result = ImageEffect.apply_effect(
-            self.current_wallpaper,
-            effect_name,
-            intensity,
-            output_path=self.current_wallpaper,
-        )
+    async def _set_wallpaper(self, image_path: Path) -> None:
+        """Применение эффектов и установка изображения как обоев"""
+        self.set_wallpaper_button.setEnabled(False)
+        stack = self._pending_stack()
+        try:
+            # Все эффекты применяются за одно чтение и одну запись файла;
+            # новое содержимое сохраняется через сохранятель, чтобы хранилище
+            # и индекс библиотеки не ссылались на старое
+            result = await self.saver.replace_content(
+                image_path,
+                # Временный файл сбрасывает на диск сам сохранятель
+                lambda path: ImageEffect.apply_stack(
+                    image_path, stack, output_path=path, fsync="off"
+                ),
+            )
+        finally:
+            self.set_wallpaper_button.setEnabled(True)
 
         if result:
-            if self.wallpaper_setter.set_wallpaper(self.current_wallpaper):
+            self.effect_stack = EffectStack()
+            if self.wallpaper_setter.set_wallpaper(image_path):
+                # Запись индекса уже обновлена при замене содержимого,
+                # остается учесть показ
+                self.saver.record_shown(image_path)
                 self.status_label.setText("✅ Обои успешно установлены")
             else:
                 self.status_label.setText("❌ Не удалось установить обои")
@@ -261,6 +346,13 @@ class MainWindow(QMainWindow):
                 "❌ Ошибка при применении эффекта перед установкой"
             )
 
+    def add_to_favourites(self) -> None:
+        """Добавление текущего изображения в избранное"""
+        if not self.current_wallpaper:
+            return
+        self.saver.set_favourite(self.current_wallpaper)
+        self.status_label.setText("⭐ Обои добавлены в избранное")
+
     def handle_download(self) -> None:
         """Обработчик нажатия кнопки скачивания"""
         if not self.download_button.isEnabled():
@@ -271,47 +363,26 @@ class MainWindow(QMainWindow):
         """Асинхронная загрузка обоев"""
         self.download_button.setEnabled(False)
         self.set_wallpaper_button.setEnabled(False)
+        self.favourite_button.setEnabled(False)
         self.progress_bar.show()
         self.status_label.setText("⏳ Загрузка...")
 
         try:
-            category = self.category_combo.currentText()
-            resolution = self.resolution_combo.currentText()
-
-            async with aiohttp.ClientSession() as session:
-                # Обновляем путь каталога
-                self.parser.catalog_path = self.config.get_catalog_path(
-                    CATEGORIES[category], RESOLUTIONS[resolution]
-                )
-
-                # Получаем URL изображения
-                self.status_label.setText("🔍 Получение ссылки на изображение...")
-                image_url = await self.parser.get_random_image_url()
-                self.progress_bar.setValue(30)
+            # Обновляем путь каталога
+            self._update_prefetch_catalog()
 
-                if not image_url:
-                    raise ParsingError("Не удалось получить URL изображения")
+            # Берем подготовленные обои или загружаем новые
+            self.status_label.setText("📥 Загрузка изображения...")
+            self.progress_bar.setValue(30)
+            self._set_current_wallpaper(await self.prefetch_queue.get())
+            self.effect_stack = EffectStack()
+            self.progress_bar.setValue(90)
 
-                # Загружаем изображение
-                self.status_label.setText("📥 Загрузка изображения...")
-                image_data = await self.parser.download_image(image_url, session)
-                self.progress_bar.setValue(60)
-
-                # Сохраняем изображение
-                self.status_label.setText("💾 Сохранение изображения...")
-                filename = image_url.split("/")[-1]
-                self.current_wallpaper = await self.saver.save_image(
-                    image_data, filename
-                )
-                self.progress_bar.setValue(90)
-
-                if not self.current_wallpaper:
-                    raise ParsingError("Не удалось сохранить изображение")
-
-                self.update_preview()
-                self.progress_bar.setValue(100)
-                self.set_wallpaper_button.setEnabled(True)
-                self.status_label.setText("✨ Загрузка завершена")
+            self.update_preview()
+            self.progress_bar.setValue(100)
+            self.set_wallpaper_button.setEnabled(True)
+            self.favourite_button.setEnabled(True)
+            self.status_label.setText("✨ Загрузка завершена")
 
         except Exception as e:
             logger.error(f"Ошибка при загрузке: {e}")
@@ -320,40 +391,78 @@ class MainWindow(QMainWindow):
             self.download_button.setEnabled(True)
             QTimer.singleShot(2000, self.progress_bar.hide)
 
+    async def shutdown(self) -> None:
+        """Освобождение сетевых ресурсов при завершении приложения"""
+        self.prefetch_queue.stop()
+        self.preview_renderer.stop()
+        logger.info(f"Статистика превью: {self.preview_renderer.stats}")
+        await self.saver.flush()
+        self.parser.cancel_background_tasks()
+        self.parser.update_stats()
+        logger.info(f"Статистика парсера: {self.parser.stats}")
+        await self.http_client.close()
+
     def apply_theme(self) -> None:
         """Применение текущей темы"""
         self.setStyleSheet(style_manager.get_styles())
 
+    def _pending_stack(self) -> EffectStack:
+        """Примененные эффекты и выбранный на панели поверх них"""
+        return self.effect_stack.push(
+            self.effect_panel.effect_combo.currentText(),
+            self.effect_panel.intensity_slider.get_value(),
+        )
+
     def _preview_effect(self) -> None:
         """Предпросмотр эффекта"""
         if not self.current_wallpaper:
             self.status_label.setText("❌ Сначала скачайте изображение")
             return
 
-        effect_name = self.effect_panel.effect_combo.currentText()
-        intensity = self.effect_panel.intensity_slider.get_value()
+        # Отрисовка идет в фоне, результат придет сигналом
+        self.preview_renderer.submit(self.current_wallpaper, self._pending_stack())
 
-        preview_data = ImageEffect.preview_effect(
-            self.current_wallpaper, effect_name, intensity
+    def _is_stale_preview(self, request: PreviewRequest) -> bool:
+        """Превью устарело: показано более новое или сменилось изображение"""
+        return (
+            request.generation <= self._shown_generation
+            or request.image_path != self.current_wallpaper
         )
 
-        if preview_data:
-            # Создаем QImage из байтов
-            image = QImage.fromData(preview_data)
-            if not image.isNull():
-                pixmap = QPixmap.fromImage(image)
-                self.preview_label.setPixmap(
-                    pixmap.scaled(
-                        self.preview_label.size(),
-                        Qt.AspectRatioMode.KeepAspectRatio,
-                        Qt.TransformationMode.SmoothTransformation,
-                    )
+    def _show_effect_preview(
+        self, request: PreviewRequest, frame: PreviewFrame
+    ) -> None:
+        """Показ готового превью эффекта"""
+        if self._is_stale_preview(request):
+            return
+        self._shown_generation = request.generation
+
+        # QImage смотрит в буфер кадра и держит кадр, а QPixmap.fromImage
+        # копирует пиксели
+        image = frame_to_qimage(frame)
+        if not image.isNull():
+            pixmap = QPixmap.fromImage(image)
+            self.preview_label.setPixmap(
+                pixmap.scaled(
+                    self.preview_label.size(),
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation,
                 )
-                self.status_label.setText("✨ Предпросмотр эффекта применен")
-            else:
-                self.status_label.setText("❌ Ошибка при создании превью")
+            )
+            frame_time = time.perf_counter() - request.submitted_at
+            self.preview_renderer.stats.record_frame(frame_time)
+            self.status_label.setText(
+                f"✨ Предпросмотр эффекта применен ({frame_time * 1000:.0f} мс)"
+            )
         else:
-            self.status_label.setText("❌ Ошибка при применении эффекта")
+            self.status_label.setText("❌ Ошибка при создании превью")
+
+    def _effect_preview_failed(self, request: PreviewRequest) -> None:
+        """Ошибка отрисовки превью эффекта"""
+        if self._is_stale_preview(request):
+            return
+        self._shown_generation = request.generation
+        self.status_label.setText("❌ Ошибка при применении эффекта")
 
     def _apply_effect(self) -> None:
         """Применение эффекта"""
@@ -361,26 +470,27 @@ class MainWindow(QMainWindow):
             self.status_label.setText("❌ Сначала скачайте изображение")
             return
 
-        effect_name = self.effect_panel.effect_combo.currentText()
-        intensity = self.effect_panel.intensity_slider.get_value()
+        stack = self._pending_stack()
+        unknown = stack.unknown_effects()
+        if unknown:
+            logger.error(f"Неизвестный эффект: {', '.join(unknown)}")
+            self.status_label.setText("❌ Ошибка при применении эффекта")
+            return
 
-        result = ImageEffect.apply_effect(
-            self.current_wallpaper, effect_name, intensity
+        # Эффект добавляется в стек, файл будет записан при установке обоев
+        self.effect_stack = stack
+        self.preview_renderer.submit(self.current_wallpaper, self.effect_stack)
+        self.status_label.setText(
+            f"✅ Эффект успешно применен (всего: {len(self.effect_stack)})"
         )
 
-        if result:
-            self.status_label.setText("✅ Эффект успешно применен")
-            # Обновляем превью
-            self.update_preview()
-        else:
-            self.status_label.setText("❌ Ошибка при применении эффекта")
-
     def _reset_effect(self) -> None:
         """Сброс эффектов"""
         if not self.current_wallpaper:
             self.status_label.setText("❌ Сначала скачайте изображение")
             return
 
-        # Просто обновляем превью исходного изображения
+        # Забываем примененные эффекты и показываем исходное изображение
+        self.effect_stack = EffectStack()
         self.update_preview()
         self.status_label.setText("↺ Эффекты сброшены")
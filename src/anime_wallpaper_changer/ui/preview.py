@@ -0,0 +1,156 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, cast
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from anime_wallpaper_changer.core.effects import (
+    EffectStack,
+    ImageEffect,
+    PreviewFrame,
+)
+from anime_wallpaper_changer.core.resilience import LatencyTracker
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FRAME_WINDOW = 120
+QIMAGE_FORMATS = {
+    "RGB": QImage.Format.Format_RGB888,
+    "RGBA": QImage.Format.Format_RGBA8888,
+}
+
+
+def release_frame(frame: PreviewFrame) -> None:
+    """Вызывается PyQt при удалении QImage, после чего кадр можно отпустить"""
+
+
+def frame_to_qimage(frame: PreviewFrame) -> QImage:
+    """
+    QImage поверх буфера кадра без копирования пикселей.
+
+    QImage не владеет буфером, поэтому кадр передается как cleanupInfo:
+    PyQt держит его, пока жив QImage. QPixmap.fromImage делает свою копию.
+    """
+    # В заглушках PyQt6 указан только bytes, но принимается любой буфер
+    return QImage(
+        cast(bytes, frame.data),
+        frame.width,
+        frame.height,
+        frame.stride,
+        QIMAGE_FORMATS[frame.mode],
+        release_frame,
+        frame,
+    )
+
+
+@dataclass(frozen=True)
+class PreviewRequest:
+    """Запрос на отрисовку превью"""
+
+    generation: int
+    image_path: Path
+    stack: EffectStack
+    submitted_at: float
+
+
+@dataclass
+class PreviewStats:
+    """Время кадров превью от запроса до показа"""
+
+    submitted: int = 0
+    rendered: int = 0
+    coalesced: int = 0
+    frames: LatencyTracker = field(
+        default_factory=lambda: LatencyTracker(FRAME_WINDOW, 1)
+    )
+
+    def record_frame(self, seconds: float) -> None:
+        """Учет показанного кадра"""
+        self.frames.record(seconds)
+
+    def __str__(self) -> str:
+        p50 = self.frames.percentile(0.5)
+        p95 = self.frames.percentile(0.95)
+        return (
+            f"submitted={self.submitted}, rendered={self.rendered}, "
+            f"coalesced={self.coalesced}, "
+            f"frame_p50={p50 * 1000 if p50 is not None else 0:.1f}ms, "
+            f"frame_p95={p95 * 1000 if p95 is not None else 0:.1f}ms"
+        )
+
+
+class PreviewRenderer(QThread):
+    """
+    Отрисовка превью эффектов в отдельном потоке.
+
+    Хранится только последний запрос: запросы, пришедшие во время
+    отрисовки, заменяют друг друга, и после нее рисуется только самый
+    новый. Готовое превью передается сигналом rendered в поток интерфейса.
+    """
+
+    rendered = pyqtSignal(object, object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.stats = PreviewStats()
+        self._condition = threading.Condition()
+        self._pending: Optional[PreviewRequest] = None
+        self._generation = 0
+        self._stopping = False
+
+    @property
+    def generation(self) -> int:
+        """Номер последнего запроса"""
+        return self._generation
+
+    def submit(self, image_path: Path, stack: EffectStack) -> int:
+        """
+        Запрос превью, заменяющий еще не начатый предыдущий.
+
+        Returns:
+            int: Номер запроса
+        """
+        with self._condition:
+            self._generation += 1
+            self.stats.submitted += 1
+            if self._pending is not None:
+                self.stats.coalesced += 1
+            self._pending = PreviewRequest(
+                self._generation,
+                image_path,
+                stack,
+                time.perf_counter(),
+            )
+            self._condition.notify()
+        return self._generation
+
+    def stop(self) -> None:
+        """Остановка потока после текущей отрисовки"""
+        with self._condition:
+            self._stopping = True
+            self._pending = None
+            self._condition.notify()
+        self.wait()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._stopping
+                )
+                if self._stopping:
+                    return
+                request, self._pending = self._pending, None
+
+            assert request is not None
+            preview = ImageEffect.preview_stack(request.image_path, request.stack)
+            if preview is None:
+                self.failed.emit(request)
+            else:
+                self.stats.rendered += 1
+                self.rendered.emit(request, preview)
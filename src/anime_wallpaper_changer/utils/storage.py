@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional
+
+from anime_wallpaper_changer.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FSYNC_MODES = ("off", "always", "batch")
+TEMP_SUFFIX = ".tmp"
+
+
+def fsync_directory(path: Path) -> None:
+    """Сброс записей директории на диск, где это поддерживается"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(
+    path: Path, mode: str = "wb", fsync: str = "always"
+) -> Iterator[IO[Any]]:
+    """
+    Атомарная запись файла.
+
+    Данные пишутся в уникальный временный файл рядом с целевым, который
+    заменяет целевой только после успешной записи. Прерванная запись не
+    оставляет поврежденный файл, а одновременные записи одного файла не
+    мешают друг другу. При ошибке временный файл удаляется.
+
+    Args:
+        path (Path): Путь к файлу
+        mode (str): Режим открытия временного файла: "wb" или "w" (UTF-8)
+        fsync (str): Сброс на диск: "off" - нет, "batch" - файл перед
+            переименованием, "always" - файл и затем директория
+
+    Yields:
+        IO[Any]: Открытый временный файл
+    """
+    if fsync not in FSYNC_MODES:
+        raise ValueError(f"Неизвестный режим сброса на диск: {fsync}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=TEMP_SUFFIX, dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as file:
+            yield file
+            file.flush()
+            if fsync != "off":
+                os.fsync(file.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    if fsync == "always":
+        fsync_directory(path.parent)
+
+
+def read_json(path: Path) -> Optional[Any]:
+    """
+    Прочитать JSON-файл состояния.
+
+    Args:
+        path (Path): Путь к файлу
+
+    Returns:
+        Optional[Any]: Разобранные данные или None, если файла нет или он поврежден
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать файл состояния {path}: {e}")
+        return None
+
+
+def _write_json_file(path: Path, text: str) -> None:
+    """Запись текста через atomic_write"""
+    with atomic_write(path, "w") as file:
+        file.write(text)
+
+
+async def write_json(path: Path, data: Any) -> bool:
+    """
+    Атомарно записать JSON-файл состояния.
+
+    Данные пишутся через atomic_write, поэтому прерванная запись не
+    оставляет поврежденный файл, а одновременные записи одного файла не
+    мешают друг другу.
+
+    Args:
+        path (Path): Путь к файлу
+        data (Any): Сериализуемые в JSON данные
+
+    Returns:
+        bool: True при успешной записи
+    """
+    try:
+        text = json.dumps(data, ensure_ascii=False)
+        await asyncio.to_thread(_write_json_file, path, text)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Не удалось записать файл состояния {path}: {e}")
+        return False
@@ -0,0 +1,33 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+from anime_wallpaper_changer.core.cache import ImageUrlIndex
+
+
+def test_concurrent_compactions_leave_a_complete_index(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    index_file = tmp_path / "image_urls.jsonl"
+    index = ImageUrlIndex(index_file)
+
+    async def scenario() -> None:
+        for number in range(50):
+            await index.put(
+                f"/wallpaper/{number}", "1920x1080", f"https://img/{number}"
+            )
+        await asyncio.gather(*(index.compact() for _ in range(8)))
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(scenario())
+
+    assert not caplog.records
+
+    lines = index_file.read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(line)[0] for line in lines) == sorted(
+        f"/wallpaper/{number}" for number in range(50)
+    )
+    assert [path.name for path in tmp_path.iterdir()] == [index_file.name]
@@ -0,0 +1,51 @@
+import asyncio
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from anime_wallpaper_changer.core.dedup import PerceptualIndex, dhash
+from anime_wallpaper_changer.core.saver import ImageSaver
+
+
+def gradient_jpeg(reverse: bool = False, size: int = 256) -> bytes:
+    """JPEG of a horizontal gradient, mirrored with ``reverse``"""
+    img = Image.linear_gradient("L").rotate(90 if reverse else -90)
+    buffer = io.BytesIO()
+    img.resize((size, size * 3 // 4)).convert("RGB").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_library_stores_the_dedup_hash(tmp_path: Path) -> None:
+    saver = ImageSaver(tmp_path, indexed=True)
+    image_path = asyncio.run(saver.save_image(gradient_jpeg(), "a.jpg"))
+    assert image_path is not None and saver.library is not None
+
+    entry = saver.library.get(image_path.name)
+    assert entry is not None and entry.phash == dhash(image_path)
+
+
+def test_recent_wallpapers_are_read_from_the_library(tmp_path: Path) -> None:
+    saver = ImageSaver(tmp_path, indexed=True)
+    asyncio.run(saver.save_image(gradient_jpeg(), "a.jpg"))
+    asyncio.run(saver.save_image(gradient_jpeg(reverse=True), "b.jpg"))
+
+    # A fresh index, as after a restart, knows only what the library stores
+    index = PerceptualIndex(saver.library, max_distance=6, recent_window=10)
+    resized = tmp_path / "c.jpg"
+    resized.write_bytes(gradient_jpeg(size=512))
+
+    assert len(index) == 2
+    assert index.find_recent(dhash(resized)) == "a.jpg"
+    assert not list(tmp_path.glob("*.jsonl"))
+
+
+def test_only_the_recent_window_is_checked(tmp_path: Path) -> None:
+    saver = ImageSaver(tmp_path, indexed=True)
+    asyncio.run(saver.save_image(gradient_jpeg(), "a.jpg"))
+    asyncio.run(saver.save_image(gradient_jpeg(reverse=True), "b.jpg"))
+
+    index = PerceptualIndex(saver.library, max_distance=6, recent_window=1)
+
+    assert len(index) == 1
+    assert index.find_recent(dhash(tmp_path / "a.jpg")) is None
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from anime_wallpaper_changer.core.effects import EffectStack, ImageEffect, PreviewFrame
+
+
+def test_array_frame_shares_the_pixels() -> None:
+    pixels = np.zeros((3, 4, 3), dtype=np.uint8)
+    frame = PreviewFrame.from_array(pixels)
+
+    pixels[1, 2] = (1, 2, 3)
+
+    assert (frame.width, frame.height, frame.stride, frame.mode) == (4, 3, 12, "RGB")
+    assert np.shares_memory(np.asarray(frame.data), pixels)
+    assert bytes(frame.data[1 * 12 + 2 * 3 :][:3]) == b"\x01\x02\x03"
+
+
+def test_backends_render_the_same_preview(tmp_path: Path) -> None:
+    image_path = tmp_path / "a.png"
+    Image.linear_gradient("L").convert("RGB").save(image_path)
+    stack = EffectStack().push("Яркость", 1.3).push("Насыщенность", 0.5)
+
+    frames = []
+    for backend in ("pillow", "numpy"):
+        ImageEffect.set_backend(backend)
+        frames.append(ImageEffect.preview_stack(image_path, stack))
+    ImageEffect.set_backend("pillow")
+
+    pillow, numpy = frames
+    assert pillow is not None and numpy is not None
+    assert (pillow.width, pillow.height, pillow.stride) == (
+        numpy.width,
+        numpy.height,
+        numpy.stride,
+    )
+    difference = np.abs(
+        np.frombuffer(pillow.data, np.uint8).astype(int)
+        - np.frombuffer(numpy.data, np.uint8)
+    )
+    assert difference.max() <= 1
@@ -0,0 +1,52 @@
+import asyncio
+from pathlib import Path
+
+from anime_wallpaper_changer.core.cache import PageCountCache
+from anime_wallpaper_changer.core.config import Config
+from anime_wallpaper_changer.core.http import HttpClient
+from anime_wallpaper_changer.core.parser import WallpapersCraftParser
+
+
+class CountingParser(WallpapersCraftParser):
+    """Parser whose page count discovery is slow and counted"""
+
+    discoveries = 0
+
+    async def discover_page_count(self) -> int:
+        self.discoveries += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+
+def make_parser(tmp_path: Path) -> CountingParser:
+    config = Config()
+    return CountingParser(
+        config,
+        HttpClient(config),
+        page_count_cache=PageCountCache(tmp_path / "page_counts.json", 3600),
+    )
+
+
+def test_concurrent_rotations_share_one_discovery(tmp_path: Path) -> None:
+    parser = make_parser(tmp_path)
+
+    async def rotate() -> list[int]:
+        return await asyncio.gather(*(parser.get_page_count() for _ in range(5)))
+
+    assert asyncio.run(rotate()) == [42] * 5
+    assert parser.discoveries == 1
+    assert parser.page_count_cache.get(parser.catalog_path) == 42
+
+
+def test_cancelled_caller_does_not_abort_the_discovery(tmp_path: Path) -> None:
+    parser = make_parser(tmp_path)
+
+    async def rotate() -> int:
+        first = asyncio.create_task(parser.get_page_count())
+        second = asyncio.create_task(parser.get_page_count())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(rotate()) == 42
+    assert parser.discoveries == 1
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import os
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from PIL import Image
+
+from anime_wallpaper_changer.core.effects import EffectStack, ImageEffect
+from anime_wallpaper_changer.core.library import DiskQuota
+from anime_wallpaper_changer.core.saver import TEMP_MAX_AGE, ImageSaver
+from anime_wallpaper_changer.core.store import STORE_FOLDER_NAME
+
+
+def jpeg_bytes(color: Tuple[int, int, int]) -> bytes:
+    """Small JPEG of a solid color"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def stored_objects(saver: ImageSaver) -> List[Path]:
+    """Objects in the content store of the saver"""
+    return sorted((saver.output_dir / STORE_FOLDER_NAME).glob("*/*"))
+
+
+def brighten(saver: ImageSaver, image_path: Path) -> None:
+    """Apply an effect to a saved wallpaper the way the window does"""
+    stack = EffectStack().push("Яркость", 1.5)
+    result = asyncio.run(
+        saver.replace_content(
+            image_path,
+            lambda path: ImageEffect.apply_stack(image_path, stack, output_path=path),
+        )
+    )
+    assert result == image_path
+
+
+def test_effect_result_replaces_store_object(tmp_path: Path) -> None:
+    saver = ImageSaver(tmp_path, content_addressed=True, indexed=True)
+    image_path = asyncio.run(saver.save_image(jpeg_bytes((200, 40, 40)), "a.jpg"))
+    assert image_path is not None
+    original = stored_objects(saver)
+
+    brighten(saver, image_path)
+
+    objects = stored_objects(saver)
+    assert len(objects) == 1 and objects != original
+    assert image_path.samefile(objects[0])
+    assert saver.library is not None
+    entry = saver.library.get(image_path.name)
+    assert entry is not None and entry.sha256 == objects[0].name
+
+
+def test_effect_keeps_object_shared_with_another_name(tmp_path: Path) -> None:
+    saver = ImageSaver(tmp_path, content_addressed=True, indexed=True)
+    data = jpeg_bytes((40, 200, 40))
+    image_path = asyncio.run(saver.save_image(data, "a.jpg"))
+    twin_path = asyncio.run(saver.save_image(data, "b.jpg"))
+    assert image_path is not None and twin_path is not None
+
+    brighten(saver, image_path)
+
+    assert len(stored_objects(saver)) == 2
+    assert any(twin_path.samefile(path) for path in stored_objects(saver))
+
+
+def test_no_orphaned_objects_after_effect_and_eviction(tmp_path: Path) -> None:
+    saver = ImageSaver(
+        tmp_path, content_addressed=True, indexed=True, quota=DiskQuota(max_files=10)
+    )
+    for index, color in enumerate([(200, 40, 40), (40, 40, 200)]):
+        image_path = asyncio.run(saver.save_image(jpeg_bytes(color), f"{index}.jpg"))
+        assert image_path is not None
+        brighten(saver, image_path)
+
+    saver.quota = DiskQuota(max_files=0)
+    asyncio.run(saver.rescan())
+
+    assert saver.list_images() == []
+    assert stored_objects(saver) == []
+
+
+def test_save_landing_while_wallpaper_is_pending_keeps_it(tmp_path: Path) -> None:
+    saver = ImageSaver(
+        tmp_path, content_addressed=True, indexed=True, quota=DiskQuota(max_files=2)
+    )
+    shown = asyncio.run(saver.save_image(jpeg_bytes((200, 40, 40)), "shown.jpg"))
+    assert shown is not None
+    saver.record_shown(shown)
+    pending = asyncio.run(saver.save_image(jpeg_bytes((40, 200, 40)), "pending.jpg"))
+    assert pending is not None
+    saver.hold(pending)
+
+    # A background download that finished after the deadline
+    landed = asyncio.run(saver.save_image(jpeg_bytes((40, 40, 200)), "landed.jpg"))
+
+    assert landed is not None
+    assert shown.exists() and pending.exists() and landed.exists()
+
+    saver.release(pending)
+    asyncio.run(saver.rescan())
+    assert not pending.exists()
+
+
+def test_recovery_sweeps_stale_temp_files_in_the_store(tmp_path: Path) -> None:
+    stale_time = time.time() - TEMP_MAX_AGE - 1
+    object_dir = tmp_path / STORE_FOLDER_NAME / "ab"
+    object_dir.mkdir(parents=True)
+    stale = [object_dir / ".abcdef.1234.tmp", tmp_path / ".a.jpg.5678.tmp"]
+    for path in stale:
+        path.write_bytes(b"partial")
+        os.utime(path, (stale_time, stale_time))
+    fresh = tmp_path / ".b.jpg.9012.tmp"
+    fresh.write_bytes(b"in progress")
+
+    ImageSaver(tmp_path, content_addressed=True)
+
+    assert not any(path.exists() for path in stale)
+    assert fresh.exists()